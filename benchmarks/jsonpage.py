@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+"""
+Encoding the values of a page of 500 watchables (a third each float, int and text) as json, the old way (the standard
+library's json.dumps then encode) and with jsonser. jsonser uses orjson or ujson when installed, run the benchmark with
+and without them to see each backend.
+
+    python3 benchmarks/jsonpage.py [folder holding the pootlestuff package to test] [--longtext]
+
+--longtext makes the text values about 1KB each
+"""
+import sys, pathlib, json, timeit
+args=[arg for arg in sys.argv[1:] if not arg.startswith('--')]
+sys.path.insert(0, args[0] if args else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff import watchables as w, jsonser
+
+N=2000
+
+def makeapp(longtext):
+    defs=[]
+    for i in range(500):
+        if i % 3 == 0:
+            defs.append(('f%03d' % i, w.floatWatch, i*1.37, False))
+        elif i % 3 == 1:
+            defs.append(('i%03d' % i, w.intWatch, i, False))
+        else:
+            defs.append(('t%03d' % i, w.textWatch, ('label %d é ' % i)*(60 if longtext else 1), False))
+
+    class app(w.watchablesmart):
+        def __init__(self):
+            super().__init__(value=None, wabledefs=defs, loglevel=w.loglvls.WARN)
+
+    a=app()
+    return [(d[0], getattr(a, d[0])) for d in defs]
+
+if __name__=='__main__':
+    wl=makeapp('--longtext' in sys.argv)
+    tests=(
+        ('old json.dumps(dict).encode()',   lambda: json.dumps({k: v.getValue() for k, v in wl}).encode()),
+        ('jsonser.dumpb(dict of values)',   lambda: jsonser.dumpb({k: v.getValue() for k, v in wl})),
+        ('jsonser.dumpb(dict of watchables)', lambda: jsonser.dumpb({k: v for k, v in wl})),
+        ('old json.dumps(list of pairs)',   lambda: json.dumps([[k, v.getValue()] for k, v in wl]).encode()),
+        ('jsonser.dumpitems(watchables)',   lambda: jsonser.dumpitems(wl)),
+    )
+    assert len(set(json.dumps(json.loads(f()), sort_keys=True) for name, f in tests[:3]))==1
+    assert json.loads(tests[3][1]())==json.loads(tests[4][1]())
+    print('jsonser backend', jsonser.backend)
+    for name, f in tests:
+        f()
+        print('%-36s %7.1f us' % (name, timeit.timeit(f, number=N)/N*1e6))
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+Cost of pvars notifications: the time to build 10000 vars each with 3 notifies (an onChange for the user agent, one
+for every agent and one for two agents), then setValue on a var where 3, 1 and no observers are called.
+
+Run it against an older checkout to see the before figures.
+
+    python3 benchmarks/notifies.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, time, timeit
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff import pvars as p
+
+class app(p.rootVar):
+    def __init__(self, childdefs):
+        super().__init__(name='app', parent=None, app=None, agentlist=['user', 'app', 'net'], logformat=None, loglvl=None,
+                childdefs=childdefs)
+
+    def changed(self, var, agent, oldValue, newValue):
+        pass
+
+    def saveit(self, var, agent, oldValue, newValue):
+        pass
+
+    def refresh(self, var, agent, oldValue, newValue, view=None):
+        pass
+
+defs=[{'_cclass': p.groupVar, 'name': 'g%d' % g, 'childdefs': [
+        {'_cclass': p.floatVar, 'name': 'f%d' % i, 'value': 1.5, 'minv': 0, 'maxv': 1e6, 'onChange': ('changed', 'user')}
+        for i in range(200)]} for g in range(50)]
+
+def build():
+    a=app(defs)
+    for group in a.values():
+        for var in group.values():
+            var.addNotify('saveit', '*')
+            var.addNotify('refresh', ['user', 'net'])
+    return a
+
+vals=[float(i) for i in range(1000)]
+
+def setter(var, agent):
+    def sets():
+        for v in vals:
+            var.setValue(v, agent)
+    return sets
+
+if __name__=='__main__':
+    fastest=None
+    for i in range(5):
+        started=time.perf_counter()
+        a=build()
+        took=time.perf_counter()-started
+        if fastest is None or took < fastest:
+            fastest=took
+    print('build 10000 vars with 3 notifies each %6.0f ms' % (fastest*1e3))
+    bare=a['/g4/f8']
+    bare.removeNotify('changed', 'user')
+    bare.removeNotify('saveit', '*')
+    bare.removeNotify('refresh', ['user', 'net'])
+    for name, f in (('setValue, 3 observers called', setter(a['/g3/f7'], 'user')),
+                    ('setValue, 1 observer called', setter(a['/g3/f7'], 'app')),
+                    ('setValue, no observers', setter(bare, 'app'))):
+        print('%-28s %5.0f ns' % (name, min(timeit.repeat(f, number=100, repeat=5))/100/1000*1e9))
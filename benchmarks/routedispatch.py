@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+"""
+Time to find the handler for a request path, with 30 named pages, the way the request handler used to do it (a dict
+lookup on the path then a chain of compares on the request type) against the routetable used now.
+
+The old way is copied in here, so this needs only the current package (and pagelink, which basichttpserver imports).
+
+    python3 benchmarks/routedispatch.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, timeit
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff.basichttpserver import routetable, route
+
+N=500000
+
+requtypes=['static', 'makestaticpage', 'updatewv', 'makedynampage', 'vidstream', 'redirect', 'query']
+validrequs={'p%d' % i: (requtypes[i % len(requtypes)], {}) for i in range(30)}
+validrequs['q']=('query', {})       # the last type in the chain - the worst case for the old way
+
+def oldlookup(path):
+    pathlookup=path[1:]
+    if pathlookup in validrequs:
+        requtype, requdata = validrequs[pathlookup]
+        for t in requtypes:
+            if requtype==t:
+                return t
+    return None
+
+def handler(*args):
+    pass
+
+routes=routetable([route(name, requ[0], requ[1], handler) for name, requ in validrequs.items()]
+                + [route('static/{staticfile*}', 'static', {}, handler), route('api/{name}', 'query', {}, handler)])
+
+def newlookup(path):
+    r, pathparams = routes.match(path[1:])
+    return r.handler
+
+if __name__=='__main__':
+    for name, f, path in (
+            ('old lookup and type chain', oldlookup, '/q'),
+            ('routetable exact match', newlookup, '/q'),
+            ('routetable prefix match', newlookup, '/static/a/b.css'),
+            ('routetable {param} match', newlookup, '/api/x')):
+        print('%-26s %5.0f ns' % (name, timeit.timeit(lambda: f(path), number=N)/N*1e9))
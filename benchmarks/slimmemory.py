@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+"""
+Memory and speed of the slimwatchables classes against the watchables classes they replace.
+
+For each class 20000 instances are made, the memory they use is measured with tracemalloc (so includes the list
+that holds them) and the time to make them and to call setValue is reported.
+
+    python3 benchmarks/slimmemory.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, time, tracemalloc
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff import watchables as w, slimwatchables as s
+
+N=20000
+
+class app(w.watchableApp):
+    def __init__(self):
+        super().__init__(loglevel=w.loglvls.WARN)
+
+def measure(a, name, cls, value, newvalue, kwargs):
+    tracemalloc.start()
+    started=time.perf_counter()
+    objs=[cls(app=a, value=value, loglevel=w.loglvls.WARN, **kwargs) for i in range(N)]
+    made=time.perf_counter()
+    used=tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    started2=time.perf_counter()
+    for ob in objs:
+        ob.setValue(newvalue, w.myagents.user)
+    done=time.perf_counter()
+    print('%-15s %6.1f bytes each   create %5.2f us   setValue %5.2f us' % (name, used/N, (made-started)/N*1e6, (done-started2)/N*1e6))
+
+if __name__=='__main__':
+    a=app()
+    for name, cls, value, newvalue, kwargs in (
+            ('intWatch',       w.intWatch,       5,   6,   {'maxv': 100, 'minv': 0}),
+            ('slimintWatch',   s.slimintWatch,   5,   6,   {'maxv': 100, 'minv': 0}),
+            ('floatWatch',     w.floatWatch,     5.0, 6.0, {'maxv': 100.0, 'minv': 0.0}),
+            ('slimfloatWatch', s.slimfloatWatch, 5.0, 6.0, {'maxv': 100.0, 'minv': 0.0}),
+            ('enumWatch',      w.enumWatch,      'a', 'b', {'vlist': ['a', 'b', 'c']}),
+            ('slimenumWatch',  s.slimenumWatch,  'a', 'b', {'vlist': ['a', 'b', 'c']})):
+        measure(a, name, cls, value, newvalue, kwargs)
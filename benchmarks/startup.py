@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+"""
+Time to build an app's tree at startup from childdefs against building it from a varplan / treeplan, compiled each
+time and compiled once beforehand. Each figure is the best of 5, with garbage from earlier runs collected first.
+
+The pvars app has 50 groups of 200 float and int vars (10050 vars), with saved settings for a quarter of them. The
+plain ptree tree has 50 groups of 1000 leaves (50050 nodes), made from treeob and from slimtreeob.
+
+Run against a checkout without plans, only the childdefs figures are shown.
+
+    python3 benchmarks/startup.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, time, gc
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff import pvars as p, ptree
+
+def vardefs():
+    return [{'_cclass': p.groupVar, 'name': 'g%d' % g, 'childdefs': [
+                {'_cclass': p.floatVar, 'name': 'f%d' % i, 'fallbackValue': 1.5, 'minv': 0, 'maxv': 1000} if i % 2 else
+                {'_cclass': p.intVar, 'name': 'i%d' % i, 'minv': 0, 'maxv': 1000, 'value': 3}
+                for i in range(200)]} for g in range(50)]
+
+settings={'g%d' % g: {'f%d' % i: float(i) for i in range(1, 200, 4)} for g in range(50)}
+
+class app(p.rootVar):
+    def __init__(self, childdefs):
+        super().__init__(name='app', parent=None, app=None, agentlist=['user', 'app'], logformat=None, loglvl=None,
+                value=settings, childdefs=childdefs)
+
+def treedefs(cls):
+    return [{'_cclass': cls, 'name': 'g%d' % g, 'childdefs': [{'_cclass': cls, 'name': 'v%d' % i} for i in range(1000)]}
+            for g in range(50)]
+
+def best(f, n=5):
+    fastest=None
+    for i in range(n):
+        gc.collect()        # so the trees left from earlier runs are not cleared up in the middle of this one
+        started=time.perf_counter()
+        f()
+        took=time.perf_counter()-started
+        if fastest is None or took < fastest:
+            fastest=took
+    return fastest*1e3
+
+if __name__=='__main__':
+    d=vardefs()
+    print('pvars 10050 vars: childdefs %.0f ms' % best(lambda: app(d)))
+    if hasattr(p, 'varplan'):
+        plan=p.varplan(d)
+        assert app(d).getValue()==app(plan).getValue()
+        print('    varplan including compile %.0f ms, prebuilt varplan %.0f ms, compile %.1f ms' % (
+                best(lambda: app(p.varplan(d))), best(lambda: app(plan)), best(lambda: p.varplan(d))))
+    for cls in (ptree.treeob, getattr(ptree, 'slimtreeob', None)):
+        if cls is None:
+            continue
+        d=treedefs(cls)
+        print('%-10s 50050 nodes: childdefs %.0f ms' % (cls.__name__, best(lambda: cls(name='r', parent=None, app=None, childdefs=d))))
+        if hasattr(ptree, 'treeplan'):
+            plan=ptree.treeplan(d)
+            print('    prebuilt treeplan %.0f ms' % best(lambda: cls(name='r', parent=None, app=None, childdefs=plan)))
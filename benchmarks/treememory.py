@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""
+Memory used by, and time to build, a ptree of 50 groups of 1000 leaves (50050 nodes) made from treeob and from
+slimtreeob. Memory is measured with tracemalloc, build time is the best of 5 with garbage from earlier runs collected
+first.
+
+To compare against the treeob of an older checkout (for example from before slimtreeob was added), give the folder
+holding that checkout's pootlestuff package as well; its treeob is measured first, as 'older treeob'.
+
+    python3 benchmarks/treememory.py [folder holding the pootlestuff package to test] [folder holding an older one]
+"""
+import sys, pathlib, time, tracemalloc, gc, importlib.util
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff import ptree
+
+def olderptree(folder):
+    """
+    loads ptree from another checkout under a different module name, so it can be used alongside the current one
+    """
+    spec=importlib.util.spec_from_file_location('olderptree', pathlib.Path(folder)/'pootlestuff'/'ptree.py')
+    module=importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build(cls):
+    root=cls(name='root', parent=None, app=None)
+    for g in range(50):
+        grp=cls(name='g%d' % g, parent=root, app=root)
+        for i in range(1000):
+            cls(name='v%d' % i, parent=grp, app=root)
+    return root
+
+def buildtime(cls):
+    gc.collect()
+    started=time.perf_counter()
+    build(cls)
+    return time.perf_counter()-started
+
+if __name__=='__main__':
+    classes=[('treeob', ptree.treeob), ('slimtreeob', ptree.slimtreeob)]
+    if len(sys.argv) > 2:
+        classes.insert(0, ('older treeob', olderptree(sys.argv[2]).treeob))
+    for name, cls in classes:
+        gc.collect()
+        tracemalloc.start()
+        root=build(cls)
+        used=tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del root
+        print('%-12s 50050 nodes %6.1f MB  %4d bytes/node  build %5.0f ms' % (
+                name, used/1e6, used/50050, min(buildtime(cls) for i in range(5))*1e3))
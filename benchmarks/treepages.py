@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+"""
+Time to page through a ptree node with 10000 children in pages of 50, by slicing and by sliceview, and to find a
+child by position (child_at) and the position of a child (index_of). Against a checkout without sliceview the
+position lookups are timed the way they had to be done before, by making a list of the keys.
+
+    python3 benchmarks/treepages.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, timeit
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff.ptree import treeob
+
+def best(f, number):
+    return min(timeit.repeat(f, number=number, repeat=5))/number
+
+root=treeob(name='root', parent=None, app=None)
+for i in range(10000):
+    treeob(name='c%d' % i, parent=root, app=root)
+
+def pages():
+    for start in range(0, 10000, 50):
+        list(root[start:start+50].items())
+
+def viewpages():
+    for start in range(0, 10000, 50):
+        list(root.sliceview(start, start+50).items())
+
+if __name__=='__main__':
+    print('200 pages of 50 by slice     %8.2f ms' % (best(pages, 5)*1e3))
+    if hasattr(root, 'sliceview'):
+        print('200 pages of 50 by sliceview %8.2f ms' % (best(viewpages, 5)*1e3))
+        print('child_at(7777)               %8.0f ns' % (best(lambda: root.child_at(7777), 10000)*1e9))
+        print("index_of('c7777')            %8.0f ns" % (best(lambda: root.index_of('c7777'), 10000)*1e9))
+    else:
+        print('list(keys())[7777]           %8.0f ns' % (best(lambda: root[list(root.keys())[7777]], 1000)*1e9))
+        print("list(keys()).index('c7777')  %8.0f ns" % (best(lambda: list(root.keys()).index('c7777'), 1000)*1e9))
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+Time to look up nodes in a ptree by path, and to get a node's hierarchical name, in a tree with a 20 deep chain of
+nodes and one node with 10000 children.
+
+Run it against an older checkout to see the before figures.
+
+    python3 benchmarks/treepaths.py [folder holding the pootlestuff package to test]
+"""
+import sys, pathlib, timeit
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else str(pathlib.Path(__file__).resolve().parent.parent))
+from pootlestuff.ptree import treeob
+
+N=20000
+
+def maketree():
+    root=treeob(name='root', parent=None, app=None)
+    deep=root
+    for i in range(20):
+        deep=treeob(name='d%d' % i, parent=deep, app=root)
+    wide=treeob(name='wide', parent=root, app=root)
+    for i in range(10000):
+        treeob(name='w%d' % i, parent=wide, app=root)
+    return root, deep, wide
+
+if __name__=='__main__':
+    root, deep, wide=maketree()
+    deeppath='/'+'/'.join('d%d' % i for i in range(20))
+    leaf=wide['w9999']
+    for name, f in (
+            ('deep absolute path', lambda: root[deeppath]),
+            ('deep relative ../', lambda: deep['../../../d17/d18']),
+            ('wide sibling ../', lambda: leaf['../w5000']),
+            ('wide absolute path', lambda: deep['/wide/w1234']),
+            ('plain child', lambda: wide['w42']),
+            ('getHierName deep', lambda: deep.getHierName())):
+        f()
+        print('%-19s %6.0f ns' % (name, min(timeit.repeat(f, number=N, repeat=5))/N*1e9))
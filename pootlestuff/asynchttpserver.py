@@ -0,0 +1,515 @@
+#!/usr/bin/python3
+"""
+This module provides an asyncio based alternative to the httpserver and httprequh classes in basichttpserver.
+
+With httpserver every connection has its own thread, so each long lived event stream or live camera stream holds an
+OS thread for as long as the client is connected. Here all connections are handled by coroutines running in a single
+event loop thread, so streams cost very little. Calls to app code (which may block) are run in a bounded pool of
+worker threads.
+
+The server understands the same config as httpserver (the 'GET' and 'POST' dicts, 'staticroot' etc.) and is selected
+in the webserv config file:
+
+    from pootlestuff.asynchttpserver import asynchttpserver, asyncrequh
+    httpserverclass=asynchttpserver
+    httprequestclass=asyncrequh
+
+The number of worker threads is set by config['asyncworkers'] (default 8).
+"""
+import asyncio, threading, logging, socket, io, html, functools, email.utils, http.client, http.server
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from pootlestuff import basichttpserver, jsonser
+from pootlestuff.basichttpserver import pageserver, changewaker, staticresponse, rangeresponse, makepageref, parsebatch, updateevent
+
+def _nostop(f, *args, **kwargs):
+    """
+    calls f, returning None if it raises StopIteration (which cannot be passed back through an asyncio future)
+    """
+    try:
+        return f(*args, **kwargs)
+    except StopIteration:
+        return None
+
+class asynchttpserver(pageserver):
+    """
+    A web server running all connections in a single asyncio event loop. It provides serve_forever, shutdown and
+    close in the same way as httpserver so it can be run by webserv.
+    """
+    def __init__(self, server_address, RequestHandlerClass, *, config, **kwargs):
+        """
+        server_address      : 2-tuple of host and port to listen on
+
+        RequestHandlerClass : the class (normally asyncrequh) created for each connection
+
+        config              : the server config dict
+        """
+        self.RequestHandlerClass=RequestHandlerClass
+        super().__init__(config=config, **kwargs)
+        self.executor=ThreadPoolExecutor(max_workers=config.get('asyncworkers', 8), thread_name_prefix='asyncapp')
+        self.socket=socket.create_server(server_address)
+        self.server_address=self.socket.getsockname()[:2]
+        self.loop=None
+        self.stopping=None
+        self.clienttasks=set()
+        self.stopped=threading.Event()
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self.stopped.set()
+
+    async def _serve(self):
+        self.loop=asyncio.get_running_loop()
+        self.stopping=asyncio.Event()
+        aserver=await asyncio.start_server(self._newclient, sock=self.socket)
+        await self.stopping.wait()
+        aserver.close()
+        for task in list(self.clienttasks):
+            task.cancel()
+        await asyncio.gather(*self.clienttasks, return_exceptions=True)
+
+    async def _newclient(self, reader, writer):
+        task=asyncio.current_task()
+        self.clienttasks.add(task)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)    # as httprequh.disable_nagle_algorithm
+        try:
+            await self.RequestHandlerClass(self, reader, writer).handle()
+        finally:
+            self.clienttasks.discard(task)
+
+    def runblocking(self, func, *args, **kwargs):
+        """
+        returns an awaitable that runs func in the worker thread pool
+        """
+        return self.loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        if not self.loop is None and not self.stopped.is_set():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+            self.stopped.wait()
+        self.executor.shutdown(wait=False)
+
+class asyncchangewaker(changewaker):
+    """
+    a changewaker that wakes a coroutine in the given event loop rather than a thread
+    """
+    def __init__(self, watched, agents, loop):
+        self.loop=loop
+        self.achanged=asyncio.Event()
+        super().__init__(watched, agents)
+
+    def wake(self, oldValue, newValue, agent, watched):
+        self.loop.call_soon_threadsafe(self.achanged.set)
+
+    async def waitchange(self, timeout, coalesce):
+        try:
+            await asyncio.wait_for(self.achanged.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if coalesce:
+            await asyncio.sleep(coalesce)
+        self.achanged.clear()
+        return True
+
+class asyncrequh():
+    """
+    handles a connection to an asynchttpserver, the request types are the same as for httprequh.
+
+    Each request type is handled by the coroutine method _get_<request type> (or _post_<request type>).
+    
+    As with httprequh, connections are kept alive for further requests unless the client asks otherwise, the response
+    is a stream or there is an error. An idle connection is closed after config['keepalivetimeout'] seconds (default 20).
+    """
+    server_version = 'asyncpootle/0.1'
+
+    mimetypeforfile = basichttpserver.httprequh.mimetypeforfile
+
+    def __init__(self, server, reader, writer):
+        self.server=server
+        self.reader=reader
+        self.writer=writer
+        self.client_address=writer.get_extra_info('peername')
+
+    async def handle(self):
+        self.close_connection=True
+        try:
+            while await self.readrequest():
+                if self.command=='GET':
+                    await self.do_GET()
+                elif self.command=='POST':
+                    await self.do_POST()
+                else:
+                    await self.send_error(501, 'Unsupported method (%r)' % self.command)
+                if self.close_connection:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.server.log(logging.INFO, 'client %s connection lost' % str(self.client_address))
+        except asyncio.CancelledError:
+            pass
+        except:
+            self.server.log(logging.CRITICAL,'request %s failed' % getattr(self, 'path', '?'), exc_info=True, stack_info=True)
+        finally:
+            self.writer.close()
+
+    async def readrequest(self):
+        """
+        reads the request line and headers, returns True if they are OK, otherwise sends an error response and returns False
+        """
+        try:
+            head=await asyncio.wait_for(self.reader.readuntil(b'\r\n\r\n'), self.server.config.get('keepalivetimeout', 20))
+        except asyncio.LimitOverrunError:
+            await self.send_error(431, 'Request header too large')
+            return False
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return False
+        requline, _, rest = head.partition(b'\r\n')
+        bits=requline.decode('iso-8859-1').split()
+        if len(bits)!=3:
+            await self.send_error(400, 'Bad request syntax (%r)' % requline)
+            return False
+        self.command, self.path, self.request_version = bits
+        self.headers=http.client.parse_headers(io.BytesIO(rest))
+        conntype=self.headers.get('Connection', '').lower()
+        if self.request_version >= 'HTTP/1.1':
+            self.close_connection = conntype=='close'
+        else:
+            self.close_connection = conntype!='keep-alive'
+        return True
+
+    def startresponse(self, code, headers=()):
+        """
+        writes the status line and headers (plus a Server and a Date header) to the output buffer
+        """
+        try:
+            phrase=http.HTTPStatus(code).phrase
+        except ValueError:
+            phrase=''
+        lines=['HTTP/1.1 %d %s' % (code, phrase), 'Server: %s' % self.server_version, 'Date: %s' % email.utils.formatdate(usegmt=True),
+                'Connection: close' if self.close_connection else 'Connection: keep-alive']
+        lines.extend('%s: %s' % h for h in headers)
+        self.writer.write(('\r\n'.join(lines)+'\r\n\r\n').encode('latin-1', 'strict'))
+
+    async def sendall(self, code, headers=(), body=b''):
+        """
+        sends a complete response with the given body (bytes)
+        """
+        self.startresponse(code, list(headers)+[('Content-Length', len(body))])
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+
+    async def send_error(self, code, message=None):
+        self.close_connection=True
+        try:
+            shortmsg, longmsg = http.server.BaseHTTPRequestHandler.responses[code]
+        except KeyError:
+            shortmsg, longmsg = '???', '???'
+        body=(http.server.DEFAULT_ERROR_MESSAGE % {
+                'code': code, 'message': html.escape(shortmsg if message is None else message, quote=False), 'explain': html.escape(longmsg, quote=False)
+             }).encode('UTF-8', 'replace')
+        await self.sendall(code, [('Content-Type', http.server.DEFAULT_ERROR_CONTENT_TYPE)], body)
+
+    async def sendresponse(self, response):
+        """
+        sends a response dict as returned by staticresponse or rangeresponse
+        """
+        if response['resp'] >= 400 and 'msg' in response:
+            await self.send_error(response['resp'], response['msg'])
+        elif 'file' in response:
+            fpath, offset, count, sendfilemin = response['file']
+            with fpath.open('rb') as fo:
+                self.startresponse(response['resp'], response.get('headers', [])+[('Content-Length', count)])
+                await self.writer.drain()
+                if count > 0:
+                    await self.server.loop.sendfile(self.writer.transport, fo, offset, count)
+        else:
+            await self.sendall(response['resp'], response.get('headers', []), response.get('data', b''))
+
+    def startstream(self, headers):
+        """
+        sends the headers for a long lived stream, which runs until the connection closes
+        """
+        self.close_connection=True
+        self.startresponse(200, headers)
+
+    async def sendjson(self, data, headers=()):
+        await self.sendall(200, [('Content-Type', 'application/json; charset=utf-8')]+list(headers), jsonser.dumpb(data))
+
+    async def do_action(self, f, **kwargs):
+        """
+        runs app code in a worker thread and sends the response, as httprequh._do_action
+        """
+        try:
+            response=await self.server.runblocking(f, **kwargs)
+        except:
+            response={'resp':500, 'msg':'what could possibly go wring'}
+            self.server.log(logging.CRITICAL,'request %s failed' % self.path, exc_info=True, stack_info=True)
+        if response['resp']==200:
+            rdata=response['data']
+            if isinstance(rdata,str):
+                rdata=rdata.encode()
+            if isinstance(rdata, (bytes, bytearray)):
+                await self.sendall(200, response.get('headers',[]), rdata)
+            else:
+                await self.sendchunked(response.get('headers',[]), rdata)
+        else:
+            await self.send_error(response['resp'], response['msg'])
+
+    async def sendchunked(self, headers, chunks):
+        """
+        sends an iterable of strings / bytes as the body using chunked encoding, or for HTTP/1.0 clients, sends the
+        data as is and closes the connection. The iterable is run in a worker thread as it is app code.
+        """
+        chunked=self.request_version >= 'HTTP/1.1'
+        if chunked:
+            self.startresponse(200, list(headers)+[('Transfer-Encoding', 'chunked')])
+        else:
+            self.close_connection=True
+            self.startresponse(200, headers)
+        chunkiter=iter(chunks)
+        while True:
+            chunk=await self.server.runblocking(next, chunkiter, None)
+            if chunk is None:
+                break
+            if isinstance(chunk, str):
+                chunk=chunk.encode()
+            if chunk:
+                self.writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                await self.writer.drain()
+        if chunked:
+            self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+
+    async def do_datafetch(self, f, **kwargs):
+        """
+        runs app code in a worker thread, returning the result or None if it fails, as httprequh._do_datafetch
+        """
+        try:
+            return await self.server.runblocking(f, **kwargs)
+        except:
+            self.server.log(logging.CRITICAL,'request %s failed' % self.path, exc_info=True)
+            return None
+
+    async def do_GET(self):
+        parsedpath=urlparse(self.path)
+        pathlookup=parsedpath.path[1:]
+        aroute, pathparams = self.server.routes['GET'].match(pathlookup)
+        if aroute is None:
+            if not 'GET' in self.server.config:
+                self.server.log(logging.INFO,'config has no GET list')
+                await self.send_error(501, 'no GET list specified for this server')
+            else:
+                self.server.log(logging.INFO,'no GET entry for %s in config' % self.path)
+                await self.send_error(404, 'I know nothing of the page you have requested! (%s)' %pathlookup)
+            return
+        queryparams={} if parsedpath.query=='' else parse_qs(parsedpath.query)
+        if pathparams:
+            queryparams.update((pn, [pv]) for pn, pv in pathparams.items())
+        if aroute.streaming:
+            if not self.server.startstream():
+                self.server.log(logging.WARN, 'stream limit reached - request %s refused' % self.path)
+                await self.send_error(503, 'too many streams active')
+                return
+            try:
+                await aroute.handler(self, aroute.requdata, queryparams, parsedpath)
+            finally:
+                self.server.endstream()
+        else:
+            await aroute.handler(self, aroute.requdata, queryparams, parsedpath)
+
+    async def _get_static(self, requdata, queryparams, parsedpath):
+        response=await self.server.runblocking(staticresponse, self.server.config['staticroot'], queryparams['staticfile'][0],
+                        self.headers, self.server.staticcache, self.mimetypeforfile)
+        await self.sendresponse(response)
+
+    async def _get_makestaticpage(self, requdata, queryparams, parsedpath):
+        await self.do_action(requdata[0], qp=queryparams, pp=parsedpath, **requdata[1])
+
+    async def _get_makedynampage(self, requdata, queryparams, parsedpath):
+        pagelist=basichttpserver.pageupdatelist(pageid=makepageref())
+        await self.do_action(self.server.dynampagemaker(requdata[0], pagelist), qp=queryparams, pp=parsedpath, pagelist=pagelist, **requdata[1])
+
+    async def _get_updatewv(self, requdata, queryparams, parsedpath):
+        if not ('t' in queryparams and 'v' in queryparams and 'p' in queryparams):
+            self.server.log(logging.WARN, 'missing params in request %s' % list(queryparams.keys()))
+            await self.send_error(400, 'missing request params')
+            return
+        updatelist=self.server.activeupdates.get(queryparams['p'][0])
+        if updatelist is None:
+            self.server.log(logging.ERROR, 'invalid pageid in request %s' % queryparams['p'][0])
+            await self.send_error(410, 'unknown update list key')
+            return
+        try:
+            resp=await self.server.runblocking(updatelist.applyUpdate, queryparams['t'], queryparams['v'])
+        except:
+            self.server.log(logging.CRITICAL,'updatewv request %s failed' % self.path, exc_info=True)
+            await self.send_error(500, 'update failed!')
+            return
+        await self.sendjson(resp, [('Cache-Control', 'no-store')])
+
+    async def _get_updatestream(self, requdata, queryparams, parsedpath):
+        if requdata[0]=='serv':
+            func=getattr(self.server, requdata[1])
+            kwargs={}
+        else:
+            func=requdata[0]
+            kwargs=requdata[1]
+        if 'Last-Event-ID' in self.headers and not 'since' in queryparams:
+            queryparams['since']=[self.headers['Last-Event-ID']]
+        newdata=await self.do_datafetch(func, qp=queryparams, pp=parsedpath, **kwargs)
+        if newdata is None:
+            self.server.log(logging.INFO, 'request fails with parsedpath >%s<' % str(parsedpath))
+            await self.send_error(500)
+            return
+        self.startstream([('Content-Type', 'text/event-stream; charset=utf-8')])
+        while not newdata is None and self.server.serverrunning:
+            self.writer.write(updateevent(newdata, queryparams))
+            await self.writer.drain()
+            await asyncio.sleep(3)
+            newdata=await self.do_datafetch(func, qp=queryparams, pp=parsedpath, **kwargs)
+
+    async def _get_pushstream(self, requdata, queryparams, parsedpath):
+        """
+        as httprequh._get_pushstream, but the stream waits in the event loop rather than holding a thread
+        """
+        func=requdata['func']
+        kwargs=requdata.get('kwargs',{})
+        watched=requdata['watch']
+        if callable(watched):
+            watched=await self.do_datafetch(watched, qp=queryparams, pp=parsedpath)
+        newdata=None if watched is None else await self.do_datafetch(func, qp=queryparams, pp=parsedpath, **kwargs)
+        if newdata is None:
+            self.server.log(logging.INFO, 'request fails with parsedpath >%s<' % str(parsedpath))
+            await self.send_error(500)
+            return
+        coalesce=requdata.get('coalesce', .05)
+        heartbeat=requdata.get('heartbeat', 15)
+        waker=asyncchangewaker(watched, requdata.get('agents'), self.server.loop)
+        try:
+            self.startstream([('Content-Type', 'text/event-stream; charset=utf-8'), ('Cache-Control', 'no-store')])
+            self.writer.write(b'data: %s\n\n' % jsonser.dumpb(newdata))
+            await self.writer.drain()
+            while self.server.serverrunning:
+                if await waker.waitchange(timeout=heartbeat, coalesce=coalesce):
+                    newdata=await self.do_datafetch(func, qp=queryparams, pp=parsedpath, **kwargs)
+                    if newdata is None:
+                        break
+                    self.writer.write(b'data: %s\n\n' % jsonser.dumpb(newdata))
+                else:
+                    self.writer.write(b': idle\n\n')
+                await self.writer.drain()
+        finally:
+            waker.close()
+
+    async def _get_camstream(self, requdata, queryparams, parsedpath):
+        """
+        sends a live stream of frames. If the source is a framebroadcaster client the stream waits in the event loop
+        for each new frame, otherwise each call to the source's nextframe is run in a worker thread.
+        """
+        camstreaminfo=await self.server.runblocking(_nostop, requdata)
+        if camstreaminfo is None:
+            await self.send_error(402, 'no source for stream')
+            return
+        self.server.log(30, 'camstreamhandler client %s starts using %s' % (str(self.client_address), camstreaminfo))
+        try:
+            self.startstream([('Age', 0), ('Cache-Control', 'no-cache, private'), ('Pragma', 'no-cache'),
+                        ('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')])
+            if hasattr(camstreaminfo, 'pollframe'):
+                newframe=asyncio.Event()
+                loop=self.server.loop
+                camstreaminfo.onframe=lambda: loop.call_soon_threadsafe(newframe.set)
+                getframe=None
+            else:
+                getframe=functools.partial(_nostop, camstreaminfo.nextframe)
+            while self.server.serverrunning:
+                if getframe is None:
+                    try:
+                        frameinf=camstreaminfo.pollframe()
+                    except StopIteration:
+                        break
+                    if frameinf is None:
+                        await newframe.wait()
+                        newframe.clear()
+                        continue
+                else:
+                    frameinf=await self.server.runblocking(getframe)
+                    if frameinf is None:
+                        break
+                frame, conttype, datalen = frameinf
+                self.writer.write(('--FRAME\r\nContent-Type: %s\r\nContent-Length: %s\r\n\r\n' % (conttype, datalen)).encode('latin-1'))
+                self.writer.write(frame)
+                self.writer.write(b'\r\n')
+                await self.writer.drain()
+            self.server.log(30, 'camstreamhandler client %s terminated using %s' % (str(self.client_address), camstreaminfo))
+        finally:
+            camstreaminfo.streamends()
+
+    async def _get_vidstream(self, requdata, queryparams, parsedpath):
+        tp=await self.server.runblocking(requdata['resolve'], qp=queryparams)
+        try:
+            conttype=self.mimetypeforfile(tp.suffix)[1]
+        except KeyError:
+            conttype=self.mimetypeforfile('.mp4')[1]
+        await self.sendresponse(await self.server.runblocking(rangeresponse, tp, self.headers, conttype))
+
+    async def _get_redirect(self, requdata, queryparams, parsedpath):
+        await self.sendall(301, [('Location', requdata)])
+
+    async def _get_query(self, requdata, queryparams, parsedpath):
+        if 'fixed' in requdata:
+            queryparams.update(requdata['fixed'])
+        resp = await self.do_datafetch(requdata['func'], **queryparams)
+        if resp is None:
+            await self.send_error(502, "That didn't go well")
+        else:
+            await self.sendjson(resp)
+
+    async def do_POST(self):
+        parsedpath=urlparse(self.path)
+        aroute, pathparams = self.server.routes['POST'].match(parsedpath.path[1:])
+        if aroute is None:
+            if not 'POST' in self.server.config:
+                await self.send_error(501, 'no POST list specified for this server')
+            else:
+                await self.send_error(404, ('no page for %s' % self.path[1:]))
+            return
+        queryparams={} if parsedpath.query=='' else parse_qs(parsedpath.query)
+        if pathparams:
+            queryparams.update((pn, [pv]) for pn, pv in pathparams.items())
+        await aroute.handler(self, aroute.requdata, queryparams, parsedpath)
+
+    async def _post_json(self, requdata, queryparams, parsedpath):
+        th=self.headers.get('Content-Type', '')
+        if not th.startswith('application/json'):
+            await self.send_error(500,'what is ' + th)
+            return
+        ddata=await self.reader.readexactly(int(self.headers['Content-Length']))
+        jdata=jsonser.loads(ddata)
+        result=await self.server.runblocking(requdata[0], requdata[1], **jdata)
+        if result['resp']==200:
+            await self.sendjson(result['rdata'])
+        else:
+            await self.send_error(result['resp'], result['rmsg'])
+
+    async def _post_updatewvbatch(self, requdata, queryparams, parsedpath):
+        """
+        applies a batch of changes from a dynamic web page, see httprequh._post_updatewvbatch
+        """
+        try:
+            ddata=await self.reader.readexactly(int(self.headers['Content-Length']))
+            batch=parsebatch(jsonser.loads(ddata))
+        except (ValueError, TypeError, asyncio.IncompleteReadError):
+            batch=None
+        if batch is None:
+            self.server.log(logging.WARN, 'invalid updatewvbatch request %s' % self.path)
+            await self.send_error(400, 'invalid batch')
+            return
+        updatelist=self.server.activeupdates.get(batch[0])
+        if updatelist is None:
+            self.server.log(logging.ERROR, 'invalid pageid in batch request %s' % batch[0])
+            await self.send_error(410, 'unknown update list key')
+            return
+        results=await self.server.runblocking(updatelist.applybatch, batch[1])
+        await self.sendjson({'OK': True, 'results': results}, [('Cache-Control', 'no-store')])
@@ -8,8 +8,10 @@ packages are not robust for direct access from the internet.
 from socketserver import ThreadingMixIn
 from urllib.parse import urlparse, parse_qs
 import http.server
-import json, time, errno, threading, logging, pathlib
+import time, errno, threading, logging, pathlib, stat, email.utils, datetime, gzip, queue, re, heapq, selectors, socket
+from collections import OrderedDict, deque
 from pagelink import pageupdatelist
+from pootlestuff import jsonser
 
 pageid=972
 
@@ -21,14 +23,567 @@ def makepageref():
     pageid +=1
     return str(pageid)
 
-class httpserver(ThreadingMixIn, http.server.HTTPServer):
+def fileetag(fstat):
     """
-    http server class based on standard python server.HTTPserver with threading mixin (so we can handle
-    multiple concurrent requests) plus specific additional functionality
+    returns an ETag for a file built from its inode, modification time and size (as returned by os.stat)
+    """
+    return '"%x-%x-%x"' % (fstat.st_ino, fstat.st_mtime_ns, fstat.st_size)
+
+def notmodified(headers, etag, mtime):
+    """
+    checks the conditional request headers (If-None-Match and If-Modified-Since) against a file's ETag and modification
+    time, returns True if the client's copy is up to date (so a 304 response can be sent).
     
-    It allows queues of status messages to be setup which are served up as event streams on request. No session control etc. here though
+    If-None-Match takes precedence if it is present.
+    """
+    inm=headers.get('If-None-Match')
+    if not inm is None:
+        return inm.strip()=='*' or etag in [t.strip().replace('W/','',1) for t in inm.split(',')]
+    ims=headers.get('If-Modified-Since')
+    if ims:
+        try:
+            imstime=email.utils.parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        if imstime.tzinfo is None:
+            imstime=imstime.replace(tzinfo=datetime.timezone.utc)
+        return int(mtime) <= imstime.timestamp()
+    return False
+
+def acceptedencodings(accept):
+    """
+    parses an Accept-Encoding header value and returns the set of (lower case) content codings the client accepts
+    """
+    encs=set()
+    for part in accept.split(','):
+        bits=part.strip().split(';')
+        enc=bits[0].strip().lower()
+        if enc:
+            q=1.0
+            for param in bits[1:]:
+                pn, _, pv = param.partition('=')
+                if pn.strip()=='q':
+                    try:
+                        q=float(pv)
+                    except ValueError:
+                        q=0
+            if q > 0:
+                encs.add(enc)
+    return encs
+
+def _validators(staticinf, etag, mtime):
+    hdrs=[('ETag', etag), ('Vary', 'Accept-Encoding'), ('Last-Modified', email.utils.formatdate(int(mtime), usegmt=True))]
+    if 'cachecontrol' in staticinf:
+        hdrs.append(('Cache-Control', staticinf['cachecontrol']))
+    return hdrs
+
+def staticresponse(staticinf, statfile, headers, cache, mimetype):
+    """
+    works out the response to a request for a file from the static folder.
+    
+    Responses carry an ETag and Last-Modified header, and conditional requests for unchanged files get a 304
+    response. Files of at least staticroot['sendfilemin'] bytes (default 64K) are sent with sendfile rather than
+    being read into memory. If staticroot['cachecontrol'] is present it is sent as the Cache-Control header.
+    
+    If the client accepts br or gzip encoding and there is a precompressed sibling file (the file name with .br or
+    .gz appended) that is not older than the file, the sibling is sent instead.
+    
+    If a cache (see staticcache) is given, small files are served from the cache, which also holds gzipped versions
+    of compressible files.
+    
+    staticinf   : the server config's 'staticroot' dict
+    
+    statfile    : path of the requested file relative to the static folder
+    
+    headers     : the request headers
+    
+    cache       : a staticcache or None
+    
+    mimetype    : function that returns the Content-Type header (as a 2-tuple) for a file extension
+    
+    returns a response dict with:
+        'resp'      : the response code
+        'headers'   : list of 2-tuples to send as headers
+        'data'      : (optional) bytes to send as the body
+        'file'      : (optional) 4-tuple (path, offset, count, sendfilemin) of file data to send as the body
+        'msg'       : message for error responses
+    """
+    staticfile=staticinf['path']/statfile
+    try:
+        fstat=staticfile.stat()
+    except OSError:
+        fstat=None
+    if fstat is None or not stat.S_ISREG(fstat.st_mode):
+        return {'resp':404, 'msg':'file %s not present or not a file' % str(staticfile)}
+    try:
+        sfx=mimetype(staticfile.suffix)
+    except:
+        return {'resp':501, 'msg':"no mime type found in server config['mimetypes'] for %s" % staticfile.suffix}
+    encs=acceptedencodings(headers.get('Accept-Encoding', ''))
+    sendfile, sendstat, encoding, body = staticfile, fstat, None, None
+    for enc, encsuffix in (('br', '.br'), ('gzip', '.gz')):
+        if enc in encs:
+            sibling=staticfile.with_name(staticfile.name+encsuffix)
+            try:
+                sibstat=sibling.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(sibstat.st_mode) and sibstat.st_mtime >= fstat.st_mtime:
+                sendfile, sendstat, encoding = sibling, sibstat, enc
+                break
+    etag=fileetag(sendstat)
+    if encoding is None and not cache is None and fstat.st_size <= cache.maxfile:
+        body, gzbody = cache.get(staticfile, fstat, sfx[1])
+        if not gzbody is None and 'gzip' in encs:
+            body, encoding = gzbody, 'gzip'
+            etag=etag[:-1]+'-gz"'
+    if notmodified(headers, etag, fstat.st_mtime):
+        return {'resp':304, 'headers':_validators(staticinf, etag, fstat.st_mtime)}
+    hdrs=[sfx]
+    if not encoding is None:
+        hdrs.append(('Content-Encoding', encoding))
+    hdrs.extend(_validators(staticinf, etag, fstat.st_mtime))
+    if body is None:
+        return {'resp':200, 'headers':hdrs, 'file':(sendfile, 0, sendstat.st_size, staticinf.get('sendfilemin', 65536))}
+    else:
+        return {'resp':200, 'headers':hdrs, 'data':body}
+
+def rangeresponse(filepath, headers, conttype):
+    """
+    works out the response to a request for a file (typically a video) supporting byte ranges so clients can seek
+    within the file.
+    
+    A request without a Range header gets the whole file with a 200 response, a single range (including open
+    ended and suffix ranges) gets a 206 response and a range beyond the end of the file gets 416. If the request
+    has an If-Range header that doesn't match the file, the whole file is sent. Other forms of range request 
+    are answered with the whole file.
+    
+    The file data is always sent using sendfile, so large ranges are streamed rather than read into memory.
+    
+    returns a response dict as for staticresponse
+    """
+    try:
+        fstat=filepath.stat()
+    except OSError:
+        fstat=None
+    if fstat is None or not stat.S_ISREG(fstat.st_mode):
+        return {'resp':404, 'msg':'file not found'}
+    fsize=fstat.st_size
+    etag=fileetag(fstat)
+    frange=parserange(headers.get('Range'), fsize)
+    ifrange=headers.get('If-Range')
+    if frange and ifrange and not ifrangematches(ifrange, etag, fstat.st_mtime):
+        frange=None
+    if frange is False:
+        return {'resp':416, 'headers':[('Content-Range', 'bytes */%d' % fsize)], 'data':b''}
+    start, end = (0, fsize-1) if frange is None else frange
+    hdrs=[('Content-Type', conttype), ('Accept-Ranges','bytes'), ('ETag', etag),
+            ('Last-Modified', email.utils.formatdate(int(fstat.st_mtime), usegmt=True))]
+    if not frange is None:
+        hdrs.append(('Content-Range', 'bytes %d-%d/%d' % (start, end, fsize)))
+    return {'resp':200 if frange is None else 206, 'headers':hdrs, 'file':(filepath, start, end-start+1, 0)}
+
+streamtypes=('updatestream', 'pushstream', 'camstream')    # long lived request types, limited by config['maxstreams']
+
+class route():
+    """
+    a single compiled entry in a routetable
+    """
+    def __init__(self, pattern, requtype, requdata, handler):
+        """
+        pattern : the key from the config dict
+        
+        requtype: the type of request (e.g. 'makestaticpage')
+        
+        requdata: the data for the request from the config dict
+        
+        handler : the function (from the request handler class) that processes the request, it is called with the
+                  request handler instance, requdata, the query params and the parsed path
+        """
+        self.pattern=pattern
+        self.requtype=requtype
+        self.requdata=requdata
+        self.handler=handler
+        self.streaming=requtype in streamtypes
+
+    def __repr__(self):
+        return '%s(%s -> %s)' % (type(self).__name__, self.pattern, self.requtype)
+
+class routetable():
+    """
+    The compiled routes for one http method, built from the server config's 'GET' or 'POST' dict, so that finding the
+    handler for a request is a single dict lookup for exact paths.
+    
+    The keys in the config dict (paths without the leading '/') can be:
+        exact paths         : 'index.html'
+        parameterised paths : 'cam/{camid}/live' - each {name} matches a single path segment
+        prefix paths        : 'recordings/{filename*}' - a final {name*} matches the rest of the path
+    
+    The matched parts of parameterised and prefix paths are returned as a dict of path params.
+    
+    Exact paths are checked first, then prefix paths (longest first) and then parameterised paths in the order they
+    appear in the config.
+    """
+    paramre=re.compile(r'\{(\w+)(\*?)\}')
+
+    def __init__(self, routes):
+        """
+        routes: iterable of route objects
+        """
+        self.exact={}
+        self.prefixes=[]
+        self.patterns=[]
+        for aroute in routes:
+            params=self.paramre.findall(aroute.pattern)
+            if not params:
+                self.exact[aroute.pattern]=aroute
+            elif len(params)==1 and params[0][1]=='*' and aroute.pattern.endswith('}'):
+                self.prefixes.append((aroute.pattern[:aroute.pattern.index('{')], params[0][0], aroute))
+            else:
+                rex=''
+                lastend=0
+                for m in self.paramre.finditer(aroute.pattern):
+                    rex += re.escape(aroute.pattern[lastend:m.start()]) + ('(?P<%s>.*)' if m.group(2) else '(?P<%s>[^/]+)') % m.group(1)
+                    lastend=m.end()
+                rex += re.escape(aroute.pattern[lastend:])
+                self.patterns.append((re.compile(rex), aroute))
+        self.prefixes.sort(key=lambda p: len(p[0]), reverse=True)
+
+    def match(self, path):
+        """
+        finds the route for a path (without the leading '/').
+        
+        returns a 2-tuple of the route (or None if there is no match) and a dict of path params (or None)
+        """
+        aroute=self.exact.get(path)
+        if not aroute is None:
+            return aroute, None
+        for prefix, pname, aroute in self.prefixes:
+            if path.startswith(prefix):
+                return aroute, {pname: path[len(prefix):]}
+        for rex, aroute in self.patterns:
+            m=rex.fullmatch(path)
+            if m:
+                return aroute, m.groupdict()
+        return None, None
+
+class staticcache():
+    """
+    An LRU cache for small static files, bounded by the total bytes held.
+    
+    Entries are keyed on the file's path, modification time and size, so a changed file is re-read automatically.
+    Each entry holds the file's contents and (for compressible content types) a gzip encoded version.
+    """
+    gziptypes=('text/', 'javascript', 'json', 'svg')
+
+    def __init__(self, maxbytes, maxfile=65536, gzipmin=512):
+        """
+        maxbytes: the total size of all bodies held in the cache
+        
+        maxfile : files larger than this are never cached
+        
+        gzipmin : files smaller than this are not gzipped
+        """
+        self.maxbytes=maxbytes
+        self.maxfile=maxfile
+        self.gzipmin=gzipmin
+        self.entries=OrderedDict()
+        self.pathkeys={}        # the key of the current entry (if any) for each path
+        self.used=0
+        self.lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def get(self, path, fstat, ctype):
+        """
+        returns a 2-tuple of (file contents, gzipped file contents or None) for the given file, reading it if it is not
+        in the cache or has changed.
+        
+        path    : pathlib.Path of the file
+        
+        fstat   : result of stat for the file
+        
+        ctype   : the content type of the file - used to decide if gzip is worthwhile
+        """
+        spath=str(path)
+        key=(spath, fstat.st_mtime_ns, fstat.st_size)
+        with self.lock:
+            entry=self.entries.get(key)
+            if not entry is None:
+                self.entries.move_to_end(key)
+                self.hits+=1
+                return entry
+            self.misses+=1
+        with path.open('rb') as sfile:
+            body=sfile.read()
+        gzbody=None
+        if len(body) >= self.gzipmin and [1 for gt in self.gziptypes if gt in ctype]:
+            gzbody=gzip.compress(body, mtime=0)
+            if len(gzbody) >= len(body):
+                gzbody=None
+        entry=(body, gzbody)
+        esize=len(body)+(0 if gzbody is None else len(gzbody))
+        if esize <= self.maxbytes:
+            with self.lock:
+                oldkey=self.pathkeys.get(spath)
+                if not oldkey is None and oldkey in self.entries:
+                    self._drop(oldkey)
+                self.entries[key]=entry
+                self.pathkeys[spath]=key
+                self.used+=esize
+                while self.used > self.maxbytes:
+                    self._drop(next(iter(self.entries)))
+                    self.evictions+=1
+        return entry
+
+    def _drop(self, key):
+        body, gzbody = self.entries.pop(key)
+        self.used-=len(body)+(0 if gzbody is None else len(gzbody))
+        if self.pathkeys.get(key[0])==key:
+            del self.pathkeys[key[0]]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries), 'bytes': self.used}
+
+def parserange(rangehead, size):
+    """
+    parses the value of a Range header for a file of the given size.
+    
+    Single ranges are supported - 'bytes=start-end', 'bytes=start-' and 'bytes=-suffixlength'.
+    
+    returns:
+        None if there is no range or the range is not one we handle (so the whole file should be sent)
+        False if the range cannot be satisfied (so a 416 response should be sent)
+        a 2-tuple (start, end) of the first and last bytes to send
+    """
+    if not rangehead:
+        return None
+    unit, _, spec = rangehead.strip().partition('=')
+    if unit.strip()!='bytes' or ',' in spec:
+        return None
+    rstarts, sep, rends = spec.strip().partition('-')
+    if sep!='-':
+        return None
+    try:
+        if rstarts=='':
+            suffixlen=int(rends)
+            if suffixlen <= 0:
+                return False
+            return max(0, size-suffixlen), size-1
+        start=int(rstarts)
+        end=size-1 if rends=='' else int(rends)
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size-1)
+
+def ifrangematches(ifrange, etag, mtime):
+    """
+    returns True if the value of an If-Range header (an entity tag or a date) matches the current file
+    """
+    ifrange=ifrange.strip()
+    if ifrange.startswith('"') or ifrange.startswith('W/'):
+        return ifrange==etag
+    try:
+        return email.utils.parsedate_to_datetime(ifrange).timestamp()==int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+class changewaker():
+    """
+    subscribes to a set of watchables and wakes a single waiting thread whenever any of them changes.
+    
+    Used by push mode event streams so the handler thread only runs when there is something new to send.
+    """
+    def __init__(self, watched, agents=None):
+        """
+        watched : iterable of watchables to observe
+        
+        agents  : the agents whose changes should wake the stream, if None then all agents of each watchable's app are used
+        """
+        self.changed=threading.Event()
+        self.subs=[]
+        for w in watched:
+            for ag in (w.app.agentclass if agents is None else agents):
+                w.addNotify(self.wake, ag)
+                self.subs.append((w, ag))
+
+    def wake(self, oldValue, newValue, agent, watched):
+        self.changed.set()
+
+    def waitchange(self, timeout, coalesce):
+        """
+        waits for a change to any watched value.
+        
+        timeout : max time to wait (seconds) for a change
+        
+        coalesce: after a change arrives, wait this long so a burst of changes results in a single wakeup
+        
+        returns True if there was a change, False if the timeout expired
+        """
+        if not self.changed.wait(timeout):
+            return False
+        if coalesce:
+            time.sleep(coalesce)
+        self.changed.clear()
+        return True
+
+    def close(self):
+        for w, ag in self.subs:
+            try:
+                w.dropNotify(self.wake, ag)
+            except ValueError:
+                pass
+        self.subs=[]
+
+class livepage():
+    """
+    wraps the pageupdatelist for a dynamic page while it is active, so that updates from the web page (single
+    updatewv requests or batches from updatewvbatch) are applied one at a time, in the order they arrive.
     
-    The overall operation is controlled by a 
+    Each set of changes fetched from the pageupdatelist is given a sequence number, the most recent sets are kept so a
+    client can ask for just the changes since the last sequence number it saw (see changessince).
+    """
+    def __init__(self, pagelist, log, history=32):
+        """
+        pagelist: the pageupdatelist for the page
+
+        log     : function used to log failed updates (the server's log method)
+        
+        history : the number of sets of changes kept for clients that ask for changes since a sequence number
+        """
+        self.pagelist=pagelist
+        self.pageid=pagelist.pageid
+        self.log=log
+        self.lock=threading.Lock()
+        self.lastactive=time.monotonic()    # updated by each request for the page, used by the server's expiry checks
+        self.seq=0                          # sequence number of the latest set of changes
+        self.history=deque(maxlen=history)  # (sequence number, dict of changes) for recent sets of changes
+        self.snapshot={}                    # latest value of everything that has changed since the page was made
+
+    def applyUpdate(self, t, v):
+        with self.lock:
+            self.lastactive=time.monotonic()
+            return self.pagelist.applyUpdate(t, v)
+
+    def applybatch(self, updates):
+        """
+        applies a list of updates in order while holding the page's lock, so no other update for the page can be
+        interleaved.
+
+        updates : list of (target, value) pairs as would be sent in the t and v params of updatewv
+
+        returns a list with the result for each update. An update that fails does not stop the rest of the batch,
+        its result is {'OK': False, 'fail': 'update failed'}
+        """
+        results=[]
+        with self.lock:
+            self.lastactive=time.monotonic()
+            for t, v in updates:
+                try:
+                    results.append(self.pagelist.applyUpdate([t], [v]))
+                except:
+                    self.log(logging.CRITICAL,'update of %s on page %s failed' % (t, self.pageid), exc_info=True)
+                    results.append({'OK': False, 'fail': 'update failed'})
+        return results
+
+    def _pull(self):   # call with lock held
+        changes=self.pagelist.getupdates()
+        if changes:
+            self.seq+=1
+            cdict=dict(changes)
+            self.history.append((self.seq, cdict))
+            mergechanges(self.snapshot, cdict)
+        return changes
+
+    def getupdates(self):
+        """
+        returns the changes since the last call, as returned by the pageupdatelist
+        """
+        with self.lock:
+            self.lastactive=time.monotonic()
+            return self._pull()
+
+    def changessince(self, since):
+        """
+        returns the changes since a sequence number as a dict:
+            'seq'       : the sequence number of the latest changes, the client passes this as since in its next request
+            'full'      : False if 'updates' holds only the changes since 'since', True if 'updates' is a full snapshot of
+                          everything that has changed since the page was made (the client is too far behind or since is
+                          not a number this page has issued)
+            'updates'   : list of [key, value] pairs
+        
+        since   : the sequence number the client last had, or None to get the full snapshot
+        """
+        with self.lock:
+            self.lastactive=time.monotonic()
+            self._pull()
+            if since==self.seq:
+                return {'seq': self.seq, 'full': False, 'updates': []}
+            if not since is None and 0 <= since < self.seq and self.history and self.history[0][0] <= since+1:
+                merged={}
+                for cseq, cdict in self.history:
+                    if cseq > since:
+                        mergechanges(merged, cdict)
+                return {'seq': self.seq, 'full': False, 'updates': list(merged.items())}
+            return {'seq': self.seq, 'full': True, 'updates': list(self.snapshot.items())}
+
+    def haslinks(self):
+        return self.pagelist.haslinks()
+
+    def hasexpired(self):
+        return self.pagelist.hasexpired()
+
+    def closelist(self):
+        self.pagelist.closelist()
+
+def mergechanges(target, changes):
+    """
+    adds a dict of changes for a page to target (a dict). Values that are dicts with integer keys (the changed entries
+    from an array watchable such as floatArrayWatch) are merged with the entries already in target for that key, other
+    values replace the value in target.
+    """
+    for k, v in changes.items():
+        old=target.get(k)
+        if isinstance(v, dict) and isinstance(old, dict) and all(isinstance(ix, int) for ix in v):
+            merged=old.copy()
+            merged.update(v)
+            target[k]=merged
+        else:
+            target[k]=v
+
+def updateevent(newdata, queryparams):
+    """
+    returns an updatestream event (bytes) for the data.
+    
+    If the data is from livepage.changessince, the event is given the sequence number as its id, and queryparams['since']
+    is updated so the next fetch returns only the changes after this event.
+    """
+    if isinstance(newdata, dict) and 'seq' in newdata:
+        queryparams['since']=[str(newdata['seq'])]
+        return b'id: %d\ndata: %s\n\n' % (newdata['seq'], jsonser.dumpb(newdata))
+    return b'data: %s\n\n' % jsonser.dumpb(newdata)
+
+def parsebatch(jdata):
+    """
+    checks the decoded json body of an updatewvbatch request, returns a 2-tuple of page id and list of (target, value)
+    pairs, or None if the body is not valid
+    """
+    if not isinstance(jdata, dict) or not isinstance(jdata.get('p'), str) or not isinstance(jdata.get('updates'), list):
+        return None
+    updates=jdata['updates']
+    if not all(isinstance(upd, list) and len(upd)==2 for upd in updates):
+        return None
+    return jdata['p'], updates
+
+class pageserver():
+    """
+    The functionality shared by the different server classes: the config, logging, the static file cache and the 
+    lists of active updates for dynamic pages.
+    
+    It allows queues of status messages to be setup which are served up as event streams on request. No session control etc. here though
     """
     def __init__(self, *args, config, **kwargs):
         self.config=config
@@ -36,11 +591,24 @@ class httpserver(ThreadingMixIn, http.server.HTTPServer):
         self.loglvl=logging.DEBUG
         self.logger.setLevel(self.loglvl)
         self.serverrunning=True
-        self.activeupdates={}
+        self.activeupdates={}   # only changed with slock held, so requests can look up pages without taking the lock
         self.slock=threading.Lock()
-        th=threading.Thread(name='listchecker', target=self.runner)
-        th.start()
+        self.expirywake=threading.Condition(self.slock)
+        self.expiryqueue=[]     # heap of (check time, pageid) for the pages in activeupdates
+        self.updatecheck=config.get('updatecheck', 5)
+        self.updatehistory=config.get('updatehistory', 32)
+        maxstreams=config.get('maxstreams')
+        self.streamslots=None if maxstreams is None else threading.BoundedSemaphore(maxstreams)
+        staticinf=config.get('staticroot', {})
+        if staticinf.get('cachebytes'):
+            self.staticcache=staticcache(maxbytes=staticinf['cachebytes'], maxfile=staticinf.get('cachemaxfile', 65536),
+                        gzipmin=staticinf.get('gzipmin', 512))
+        else:
+            self.staticcache=None
+        self.listchecker=threading.Thread(name='listchecker', target=self.runner)
+        self.listchecker.start()
         super().__init__(*args, **kwargs)
+        self.reloadroutes()
 
     def close(self):
         try:
@@ -48,41 +616,353 @@ class httpserver(ThreadingMixIn, http.server.HTTPServer):
             self.log(logging.INFO, 'app closed')
         except:
             self.log(logging.ERROR, 'app close crashed', exc_info=True, stack_info=True)
-        self.serverrunning=False
+        with self.expirywake:
+            self.serverrunning=False
+            self.expirywake.notify()
         self.shutdown()
+        self.listchecker.join()
 
-    def runner(self):   # watcher to discard unused active update lists
-        while self.serverrunning:
-            with self.slock:
-                deadlist = [k for k, l in self.activeupdates.items() if l.hasexpired()]
-                for k in deadlist:
-                    uplist=self.activeupdates.pop(k)
-                    uplist.closelist()
-            time.sleep(5)
+    def runner(self):
+        """
+        discards active update lists that are no longer used.
+        
+        Each page is checked config['updatecheck'] seconds (default 5) after it was last used, so only the pages that
+        are due are looked at. A page that has been used since its check was queued is just queued again, otherwise the
+        page's update list is asked if it has expired.
+        """
+        with self.expirywake:
+            while self.serverrunning:
+                now=time.monotonic()
+                while self.expiryqueue and self.expiryqueue[0][0] <= now:
+                    checktime, pid = heapq.heappop(self.expiryqueue)
+                    uplist=self.activeupdates.get(pid)
+                    if uplist is None:
+                        continue
+                    if uplist.lastactive+self.updatecheck > now:
+                        heapq.heappush(self.expiryqueue, (uplist.lastactive+self.updatecheck, pid))
+                    elif uplist.hasexpired():
+                        del self.activeupdates[pid]
+                        uplist.closelist()
+                    else:
+                        heapq.heappush(self.expiryqueue, (now+self.updatecheck, pid))
+                self.expirywake.wait(self.expiryqueue[0][0]-now if self.expiryqueue else None)
 
     def addupdatelist(self, ulist):
-        with self.slock:
-            self.activeupdates[ulist.pageid]=ulist
+        with self.expirywake:
+            self.activeupdates[ulist.pageid]=livepage(ulist, self.log, self.updatehistory)
+            heapq.heappush(self.expiryqueue, (time.monotonic()+self.updatecheck, ulist.pageid))
+            if self.expiryqueue[0][1]==ulist.pageid:
+                self.expirywake.notify()
             
     def log(self, level, *args, **kwargs):
         if level >= self.loglvl:
             self.logger.log(level, *args, **kwargs)
 
+    def reloadroutes(self, config=None):
+        """
+        compiles the 'GET' and 'POST' dicts in the config into route tables. This is called when the server is created,
+        and can be called again at any time (for example after the app has changed the config, or with a new config)
+        to update the routes. The new tables replace the old ones in a single step, so requests in progress are not
+        affected.
+        
+        GET entries are 2-tuples of (request type, request data), the request type selects the handler method 
+        _get_<request type> of the request handler class.
+        
+        POST entries are 2-tuples of (function, data) for json posts, or (request type, request data) which select the
+        handler method _post_<request type>.
+        
+        If the config has a 'staticroot', the prefix route 'static/{staticfile*}' is added to serve static files.
+        """
+        if not config is None:
+            self.config=config
+        handlerclass=self.RequestHandlerClass
+        getroutes=[]
+        if 'staticroot' in self.config:
+            getroutes.append(route('static/{staticfile*}', 'static', None, handlerclass._get_static))
+        for pattern, entry in self.config.get('GET', {}).items():
+            try:
+                requtype, requdata = entry
+            except:
+                self.log(logging.ERROR,'GET entry for %s in config failed >%s<' % (pattern, entry))
+                continue
+            handler=getattr(handlerclass, '_get_'+requtype, None)
+            if handler is None:
+                self.log(logging.ERROR,'GET entry for %s in config has unknown request type %s' % (pattern, requtype))
+            else:
+                getroutes.append(route(pattern, requtype, requdata, handler))
+        postroutes=[]
+        for pattern, entry in self.config.get('POST', {}).items():
+            if isinstance(entry[0], str):
+                requtype, requdata = entry
+            else:
+                requtype, requdata = 'json', entry
+            handler=getattr(handlerclass, '_post_'+requtype, None)
+            if handler is None:
+                self.log(logging.ERROR,'POST entry for %s in config has unknown request type %s' % (pattern, requtype))
+            else:
+                postroutes.append(route(pattern, requtype, requdata, handler))
+        self.routes={'GET': routetable(getroutes), 'POST': routetable(postroutes)}
+
+    def dynampagemaker(self, pagefunc, pagelist):
+        """
+        returns a function that calls pagefunc to make a dynamic page, then adds the page's update list to the active
+        updates before the page is sent, so the page's first requests for updates always find it.
+        """
+        def makepage(**kwargs):
+            response=pagefunc(**kwargs)
+            if pagelist.haslinks():
+                self.addupdatelist(pagelist)
+            return response
+        return makepage
+
+    def startstream(self):
+        """
+        called before a long lived stream (updatestream, pushstream or camstream) starts. Returns True if the stream can
+        go ahead, or False if config['maxstreams'] streams are already running.
+        
+        If this returns True, endstream must be called when the stream finishes.
+        """
+        return True if self.streamslots is None else self.streamslots.acquire(blocking=False)
+
+    def endstream(self):
+        if not self.streamslots is None:
+            self.streamslots.release()
+
+    def staticstats(self):
+        """
+        returns the static file cache counters (hits, misses, evictions, entries and bytes), or None if there is no cache
+        """
+        return None if self.staticcache is None else self.staticcache.stats()
+
     def getupdates(self, qp, pp):
-        updid=qp['updatename'][0]
-        if updid in self.activeupdates:
-            return self.activeupdates[updid].getupdates()
-        else:
+        """
+        returns the changes for the page given by query param 'updatename'.
+        
+        If the query params include 'since' the result is the dict from livepage.changessince, otherwise it is the
+        changes since the last call.
+        """
+        uplist=self.activeupdates.get(qp['updatename'][0])
+        if uplist is None:
             return 'kwac'
+        elif 'since' in qp:
+            try:
+                since=int(qp['since'][0])
+            except ValueError:
+                since=None
+            return uplist.changessince(since)
+        else:
+            return uplist.getupdates()
+
+class httpserver(ThreadingMixIn, pageserver, http.server.HTTPServer):
+    """
+    http server class based on standard python server.HTTPserver with threading mixin (so we can handle
+    multiple concurrent requests) plus specific additional functionality from pageserver
+    """
+
+class pooledhttpserver(pageserver, http.server.HTTPServer):
+    """
+    http server class that handles requests with a bounded pool of worker threads rather than a new thread
+    for every connection.
+    
+    Incoming connections are queued for the workers, if the queue is full the connection is immediately sent a 503
+    response and closed.
+    
+    Each long lived stream holds a worker for as long as it runs, so an extra worker is started for each running
+    stream to keep the normal capacity available. The number of streams is limited by config['maxstreams'].
+    
+    Kept alive connections don't hold a worker while they are idle. Once a response is sent and no further request
+    is waiting, the connection is handed to a single 'httpidle' thread which watches all the idle connections and
+    queues a connection for the workers again when its next request arrives. Idle connections are closed after
+    config['keepalivetimeout'] seconds (default 20).
+    
+    The limits are set in the config:
+        'workers'   : number of worker threads (default 8)
+        'queuedepth': number of connections that can wait for a worker (default 16)
+        'maxstreams': number of long lived streams that can run at once (defaults to the number of workers)
+    """
+    def __init__(self, *args, config, **kwargs):
+        super().__init__(*args, config=config, **kwargs)
+        self.workers=config.get('workers', 8)
+        if self.streamslots is None:
+            self.streamslots=threading.BoundedSemaphore(self.workers)
+        self.reququeue=queue.Queue(maxsize=config.get('queuedepth', 16))
+        self.poollock=threading.Lock()
+        self.workercount=0
+        self.activestreams=0
+        self.parkidle=True      # tells httprequh to hand back idle kept alive connections rather than wait on them
+        self.idlesel=selectors.DefaultSelector()
+        self.idlelock=threading.Lock()
+        self.idlepending=[]     # handlers waiting to be added to idlesel by the idle thread
+        self.idlewake=socket.socketpair()
+        self.idlesel.register(self.idlewake[0], selectors.EVENT_READ, None)
+        threading.Thread(name='httpidle', target=self._idlewatch, daemon=True).start()
+        with self.poollock:
+            for i in range(self.workers):
+                self._addworker()
+
+    def _addworker(self):   # call with poollock held
+        self.workercount+=1
+        threading.Thread(name='httpworker', target=self._worker, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self._queuework((request, client_address, None), request, client_address)
+
+    def _queuework(self, work, request, client_address):
+        try:
+            self.reququeue.put_nowait(work)
+        except queue.Full:
+            self.log(logging.WARN, 'request queue full - 503 sent to %s' % str(client_address))
+            try:
+                request.sendall(b'HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            self._closeconnection(work[2], request)
+
+    def _closeconnection(self, handler, request):
+        if not handler is None:
+            handler.parkme=False
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            request, client_address, handler = self.reququeue.get()
+            try:
+                if handler is None:
+                    handler=self.RequestHandlerClass(request, client_address, self)
+                else:
+                    handler.resume()
+            except Exception:
+                self.handle_error(request, client_address)
+                handler=None
+            if handler is None or not handler.parkme:
+                self._closeconnection(None, request)
+            else:
+                self.parkconnection(handler)
+            with self.poollock:
+                if self.workercount > self.workers+self.activestreams:
+                    self.workercount-=1
+                    return
+
+    def parkconnection(self, handler):
+        """
+        hands an idle kept alive connection to the idle thread, which queues it again when the next request arrives
+        """
+        with self.idlelock:
+            self.idlepending.append(handler)
+        try:
+            self.idlewake[1].send(b'x')
+        except OSError:
+            pass
+
+    def _idlewatch(self):
+        idletimeout=self.config.get('keepalivetimeout', 20)
+        while True:
+            for key, mask in self.idlesel.select(timeout=1):
+                if key.data is None:
+                    try:
+                        self.idlewake[0].recv(4096)
+                    except OSError:
+                        pass
+                else:
+                    self.idlesel.unregister(key.fileobj)
+                    handler=key.data[0]
+                    self._queuework((handler.request, handler.client_address, handler), handler.request, handler.client_address)
+            now=time.monotonic()
+            with self.idlelock:
+                pending=self.idlepending
+                self.idlepending=[]
+            for handler in pending:
+                try:
+                    self.idlesel.register(handler.connection, selectors.EVENT_READ, (handler, now+idletimeout))
+                except (ValueError, OSError):    # connection already closed
+                    self._closeconnection(handler, handler.request)
+            for key in [key for key in self.idlesel.get_map().values() if not key.data is None and key.data[1] < now]:
+                self.idlesel.unregister(key.fileobj)
+                self._closeconnection(key.data[0], key.data[0].request)
+
+    def startstream(self):
+        if not super().startstream():
+            return False
+        with self.poollock:
+            self.activestreams+=1
+            if self.workercount < self.workers+self.activestreams:
+                self._addworker()
+        return True
+
+    def endstream(self):
+        with self.poollock:
+            self.activestreams-=1
+        super().endstream()
 
 class httprequh(http.server.BaseHTTPRequestHandler):
     """
     added functionality for handling individual requests.
     
-    A new instance of this class is created to process each incoming request to the service, which (if the server
+    A new instance of this class is created to process each incoming connection to the service, which (if the server
     uses the Threading Mixin) will also be running in a new thread.
-    """
     
+    HTTP/1.1 is used so a connection can carry multiple requests. Every response is sent with a Content-Length, with
+    chunked encoding, or closes the connection. An idle connection is closed after config['keepalivetimeout'] seconds
+    (default 20).
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are separate writes, on a kept alive connection Nagle would hold
+                                    # back the body until the client's delayed ack
+
+    def setup(self):
+        self.timeout=self.server.config.get('keepalivetimeout', 20)
+        self.parkme=False
+        super().setup()
+
+    def handle(self):
+        if getattr(self.server, 'parkidle', False):
+            self.close_connection=True
+            self.handle_one_request()
+            self._pooledrequests()
+        else:
+            super().handle()
+
+    def _pooledrequests(self):
+        """
+        for servers that park idle connections (pooledhttpserver), handles any further requests that have already
+        arrived, then sets parkme if the connection is to be kept for another request
+        """
+        while not self.close_connection:
+            try:
+                self.connection.settimeout(0)
+                waiting=self.rfile.peek(1)
+            except OSError:
+                waiting=True    # let handle_one_request find the problem
+            finally:
+                self.connection.settimeout(self.timeout)
+            if not waiting:
+                self.parkme=True
+                return
+            self.handle_one_request()
+
+    def resume(self):
+        """
+        called by pooledhttpserver when data arrives on a parked connection
+        """
+        self.parkme=False
+        try:
+            self.close_connection=True
+            self.handle_one_request()
+            self._pooledrequests()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.parkme:
+            if not self.wfile.closed:
+                self.wfile.flush()  # the connection is kept (and its files) for the next request
+        else:
+            super().finish()
+
     def _do_action(self, f, **kwargs):
         """
         internal function that wraps a call to app code in try / except checks the response and sends appropriate
@@ -98,7 +978,8 @@ class httprequh(http.server.BaseHTTPRequestHandler):
         f should return a dict with the following keys:
             'resp'      : the response code (typically 200)
             'headers'   : a list of 2-tuples, each 2-tuple sent as a header
-            'data'      : a string (which will be encoded and sent) or bytes (which will be sent)
+            'data'      : a string (which will be encoded and sent) or bytes (which will be sent), or an iterable of
+                          strings / bytes where the length is not known in advance, which is sent using chunked encoding
         """
         try:
             response=f(**kwargs)
@@ -112,12 +993,45 @@ class httprequh(http.server.BaseHTTPRequestHandler):
             rdata=response['data']
             if isinstance(rdata,str):
                 rdata=rdata.encode()
-            self.send_header('Content-Length', len(rdata))
-            self.end_headers()
-            self.wfile.write(rdata)
+            if isinstance(rdata, (bytes, bytearray)):
+                self.send_header('Content-Length', len(rdata))
+                self.end_headers()
+                self.wfile.write(rdata)
+            else:
+                self._sendchunked(rdata)
         else:
             self.send_error(response['resp'], response['msg'])
 
+    def _sendchunked(self, chunks):
+        """
+        ends the headers and sends an iterable of strings / bytes as the body using chunked encoding, or for
+        HTTP/1.0 clients, sends the data as is and closes the connection.
+        """
+        chunked=self.request_version >= 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk=chunk.encode()
+            if chunk:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _startstream(self, *headers):
+        """
+        sends the headers for a long lived stream, which runs until the connection closes
+        """
+        self.connection.settimeout(None)
+        self.send_response(200)
+        for h in headers:
+            self.send_header(*h)
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
     def _do_datafetch(self, f, **kwargs):
         """
         a very simple wrapper round a function call that passes through the result from the function or
@@ -131,200 +1045,227 @@ class httprequh(http.server.BaseHTTPRequestHandler):
 
     def do_GET(self):
         """
-        parses various info about the request runs the code appropriate for the request
+        finds the route for the request in the server's route table and runs the code appropriate for the request
         """
-        serverconfig=self.server.config     # put the config in a convenient place
         parsedpath=urlparse(self.path)      # and do 1st level parse on the request
-        if parsedpath.path.startswith('/static'):                           #if the path starts with static - serve a fixed file
-            self.servestatic(statfile=parsedpath.path[len('/static/'):])
-            return
-        try:
-            validrequs=serverconfig['GET']
-        except:
-            self.server.log(logging.INFO,'config has no GET list')
-            self.send_error(501, 'no GET list specified for this server')
-            return
         pathlookup=parsedpath.path[1:]      # ditch the leading slash
-        if pathlookup in validrequs:
-            try:
-                requtype, requdata = validrequs[pathlookup]
-            except:
-                self.server.log(logging.INFO,'GET entry for %s in config failed >%s<' % (self.path, validrequs[pathlookup])) 
-                self.send_error(404, 'server config error for the page you have requested! (%s)' %pathlookup)
-                return
-        else:
-            self.server.log(logging.INFO,'no GET entry for %s in config' % self.path) #look for the path ( without the leading '/') in GET dict
-            self.send_error(404, 'I know nothing of the page you have requested! (%s)' %pathlookup)
+        aroute, pathparams = self.server.routes['GET'].match(pathlookup)
+        if aroute is None:
+            if not 'GET' in self.server.config:
+                self.server.log(logging.INFO,'config has no GET list')
+                self.send_error(501, 'no GET list specified for this server')
+            else:
+                self.server.log(logging.INFO,'no GET entry for %s in config' % self.path)
+                self.send_error(404, 'I know nothing of the page you have requested! (%s)' %pathlookup)
             return
         queryparams={} if parsedpath.query=='' else parse_qs(parsedpath.query)  # and parse the query params (if present) - cos lots will want these
-        if requtype=='makestaticpage':
-            self._do_action(f=requdata[0], qp=queryparams, pp=parsedpath, **requdata[1])
-        elif requtype=='updatewv':
-            # user changed a value on web page; this updates the watchables's value by calling the wwlink's webset method.
-            # it returns the value as interpreted by the app if successful
-            if 't' in queryparams and 'v' in queryparams and 'p' in queryparams and queryparams['p'][0] in self.server.activeupdates:
-                updatelist=self.server.activeupdates[queryparams['p'][0]]
+        if pathparams:
+            queryparams.update((pn, [pv]) for pn, pv in pathparams.items())
+        if aroute.streaming:
+            if self.server.startstream():
                 try:
-                    resp=updatelist.applyUpdate(queryparams['t'], queryparams['v']) # we expect a dict with 'OK' and 'fail' or 'value'
-                except:
-                    self.server.log(logging.CRITICAL,'updatewv request %s failed' % self.path, exc_info=True)
-                    self.send_error(500, 'update failed!')
-                    return
-            elif 't' in queryparams and 'v' in queryparams and 'p' in queryparams:
-                print('================================================================================================')
-                print('invalid pageid in request %s' % queryparams['p'][0])
-                self.server.log(logging.ERROR, 'invalid pageid in request %s' % queryparams['p'][0])
-                self.send_error(410, 'unknown update list key')
-                return
+                    aroute.handler(self, aroute.requdata, queryparams, parsedpath)
+                finally:
+                    self.server.endstream()
             else:
-                self.server.log(logging.WARN, 'missing params in request %s' % list(queryparams.keys()))
-                self.send_error(400, 'missing request params')
-                return
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Cache-Control', 'no-store')
-            self.end_headers()
-            self.wfile.write(json.dumps(resp).encode())
+                self.server.log(logging.WARN, 'stream limit reached - request %s refused' % self.path)
+                self.send_error(503, 'too many streams active')
+        else:
+            aroute.handler(self, aroute.requdata, queryparams, parsedpath)
 
-        elif requtype=='makedynampage':
-            pagelist=pageupdatelist(pageid=makepageref())
-            self._do_action(f=requdata[0], qp=queryparams, pp=parsedpath, pagelist=pagelist, **requdata[1])
-            if pagelist.haslinks():
-                self.server.addupdatelist(pagelist)
+    def _get_static(self, requdata, queryparams, parsedpath):
+        self.servestatic(statfile=queryparams['staticfile'][0])
 
-        elif requtype=='updatestream':
-            if requdata[0]=='serv':
-                func=getattr(self.server, requdata[1])
-                print('func is', func)
-                kwargs={}
-            else:
-                func=requdata[0]
-                kwargs=requdata[1]
-            newdata=self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
-            if not newdata is None:
-                running=True
-                while running:
-                    datats=json.dumps(newdata)
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
-                    try:
-                        self.end_headers()
-                        self.wfile.write(('data: %s\n\n' % datats).encode())
-                    except Exception as e:
-                        running=False
-                        if e.errno!=errno.EPIPE:
-                            raise
-                        else:
-                            print(type(e).__name__)
-                            print('genstream client %s terminated' % str(self.client_address))
-                    time.sleep(3)
-                    if not self.server.serverrunning:
-                        running=False
-                    newdata=self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
-            else:
-                self.server.log(logging.INFO, 'request fails with parsedpath >%s<' % str(parsedpath))
-                self.send_error(500)
-        elif requtype=='camstream':
-            print('setup with', requdata)
+    def _get_makestaticpage(self, requdata, queryparams, parsedpath):
+        self._do_action(f=requdata[0], qp=queryparams, pp=parsedpath, **requdata[1])
+
+    def _get_updatewv(self, requdata, queryparams, parsedpath):
+        # user changed a value on web page; this updates the watchables's value by calling the wwlink's webset method.
+        # it returns the value as interpreted by the app if successful
+        updatelist=self.server.activeupdates.get(queryparams['p'][0]) if 'p' in queryparams else None
+        if 't' in queryparams and 'v' in queryparams and not updatelist is None:
             try:
-                camstreaminfo=requdata()
-            except StopIteration:
-                self.send_error(402, 'no source for stream')
+                resp=updatelist.applyUpdate(queryparams['t'], queryparams['v']) # we expect a dict with 'OK' and 'fail' or 'value'
+            except:
+                self.server.log(logging.CRITICAL,'updatewv request %s failed' % self.path, exc_info=True)
+                self.send_error(500, 'update failed!')
                 return
+        elif 't' in queryparams and 'v' in queryparams and 'p' in queryparams:
+            print('================================================================================================')
+            print('invalid pageid in request %s' % queryparams['p'][0])
+            self.server.log(logging.ERROR, 'invalid pageid in request %s' % queryparams['p'][0])
+            self.send_error(410, 'unknown update list key')
+            return
+        else:
+            self.server.log(logging.WARN, 'missing params in request %s' % list(queryparams.keys()))
+            self.send_error(400, 'missing request params')
+            return
+        jdat=jsonser.dumpb(resp)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', len(jdat))
+        self.end_headers()
+        self.wfile.write(jdat)
+
+    def _get_makedynampage(self, requdata, queryparams, parsedpath):
+        pagelist=pageupdatelist(pageid=makepageref())
+        self._do_action(f=self.server.dynampagemaker(requdata[0], pagelist), qp=queryparams, pp=parsedpath, pagelist=pagelist, **requdata[1])
+
+    def _get_vidstream(self, requdata, queryparams, parsedpath):
+        tp=requdata['resolve'](qp=queryparams)
+        try:
+            conttype=self.mimetypeforfile(tp.suffix)[1]
+        except KeyError:
+            conttype=self.mimetypeforfile('.mp4')[1]
+        self.servefilerange(tp, conttype)
+
+    def _get_redirect(self, requdata, queryparams, parsedpath):
+        self.send_response(301)
+        self.send_header('Location', requdata)
+        self.send_header('Content-Length', 0)
+        self.end_headers()
+
+    def _get_query(self, requdata, queryparams, parsedpath):
+        # a generic query that calls the func defined in requdata with the params from the http request and returns jsonized response
+        if 'fixed' in requdata:
+            queryparams.update(requdata['fixed'])
+        resp = self._do_datafetch(requdata['func'],**queryparams)
+        if resp is None:
+            self.send_error(502, "That didn't go well")
+        else:
+            jdat=jsonser.dumpb(resp)
             self.send_response(200)
-            self.send_header('Age', 0)
-            self.send_header('Cache-Control', 'no-cache, private')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', len(jdat))
             self.end_headers()
+            self.wfile.write(jdat)
+            print('--------------', jdat)
+
+    def _get_updatestream(self, requdata, queryparams, parsedpath):
+        if requdata[0]=='serv':
+            func=getattr(self.server, requdata[1])
+            print('func is', func)
+            kwargs={}
+        else:
+            func=requdata[0]
+            kwargs=requdata[1]
+        if 'Last-Event-ID' in self.headers and not 'since' in queryparams:
+            queryparams['since']=[self.headers['Last-Event-ID']]    # browser reconnecting, so only send what it has missed
+        newdata=self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
+        if not newdata is None:
             running=True
-            self.server.log(30, 'camstreamhandler client %s starts using %s' %   (str(self.client_address), camstreaminfo))
-            try:
-                while running and not camstreaminfo is None and self.server.serverrunning:
-                    try:
-                        frame, conttype, datalen=camstreaminfo.nextframe()
-                    except StopIteration:
-                        running=False
-                        self.server.log(30, 'camstreamhandler got StopIteration %s terminated' %   str(self.client_address))
-                    if running:
-                        try:
-                            self.wfile.write(b'--FRAME\r\n')
-                            self.send_header('Content-Type', conttype)
-                            self.send_header('Content-Length', datalen)
-                            self.end_headers()
-                            self.wfile.write(frame)
-                            self.wfile.write(b'\r\n')
-                        except BrokenPipeError:
-                            running=False
-                self.server.log(30, 'camstreamhandler client %sterminated' %   str(self.client_address))
-            except ConnectionError as ce:
-                self.server.log(30, 'camstreamhandler client connection lost %s' %  str(self.client_address))
-            except Exception as e:
-                self.server.log(30, 'camstreamhandler client %s crashed' %   (str(self.client_address)), exc_info=True, stack_info=True)
-            if not camstreaminfo is None:
-                camstreaminfo.streamends()
-        elif requtype=='vidstream':
-            tp=requdata['resolve'](qp=queryparams)
-            if tp.exists():
-                tsize=tp.stat().st_size
-                if True:
-                    rbits=self.headers.get('Range').strip().split('=')
-                    if rbits[0]=='bytes':
-                        rstarts, rends=rbits[1].split('-')
-                        start=0 if len(rstarts)==0 else int(rstarts)
-                        end=tsize-1 if len(rends)==0 else int(rends)
-                        if end >=tsize:
-                            end=tsize-1
-                        if end-start > 65535:
-                            end=start+65535
-                        with tp.open('rb') as tpo:
-                            if start != 0:
-                                tpo.seek(start)
-                            self.send_response(206)
-                            self.send_header(*self.mimetypeforfile('.mp4'))
-                            self.send_header('Content-Length', str(end-start+1))
-                            self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, end, tsize))
-                            self.send_header('Accept-Ranges','bytes')
-                            self.end_headers()
-                            rdat=tpo.read(end-start)
-                            if rdat:
-                                self.wfile.write(rdat)
-                        return
+            self._startstream(('Content-Type', 'text/event-stream; charset=utf-8'))
+            while running:
+                try:
+                    self.wfile.write(updateevent(newdata, queryparams))
+                except Exception as e:
+                    running=False
+                    if e.errno!=errno.EPIPE:
+                        raise
                     else:
-                        print('nobytes!')
-            else:
-                print('fileooops', str(tp))
-                self.send_error(502, 'video would be nice')
-        elif requtype=='redirect':
-            self.send_response(301)
-            self.send_header('Location', requdata)
-            self.end_headers()
-        elif requtype=='query': # a generic query that calls the func defined in requdata with the params from the http request and returns jsonized response
-            if 'fixed' in requdata:
-                queryparams.update(requdata['fixed'])
-            resp = self._do_datafetch(requdata['func'],**queryparams)
-            if resp is None:
-                self.send_error(502, "That didn't go well")
-            else:
-                jdat=json.dumps(resp).encode()
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json; charset=utf-8')
-                self.send_header('Content-Length', len(jdat))
-                self.end_headers()
-                self.wfile.write(jdat)
-                print('--------------', jdat)
+                        print(type(e).__name__)
+                        print('genstream client %s terminated' % str(self.client_address))
+                time.sleep(3)
+                if not self.server.serverrunning:
+                    running=False
+                newdata=self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
         else:
             self.server.log(logging.INFO, 'request fails with parsedpath >%s<' % str(parsedpath))
-            self.send_error(404)
-        return
+            self.send_error(500)
 
-    def do_POST(self):
-        serverconfig=self.server.config    # put the config in a convenient place
+    def _get_camstream(self, requdata, queryparams, parsedpath):
+        print('setup with', requdata)
         try:
-            validrequs=serverconfig['POST']
-        except:
-            self.send_error(501, 'no POST list specified for this server')
+            camstreaminfo=requdata()
+        except StopIteration:
+            self.send_error(402, 'no source for stream')
+            return
+        self._startstream(('Age', 0), ('Cache-Control', 'no-cache, private'), ('Pragma', 'no-cache'),
+                    ('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME'))
+        running=True
+        self.server.log(30, 'camstreamhandler client %s starts using %s' %   (str(self.client_address), camstreaminfo))
+        try:
+            while running and not camstreaminfo is None and self.server.serverrunning:
+                try:
+                    frame, conttype, datalen=camstreaminfo.nextframe()
+                except StopIteration:
+                    running=False
+                    self.server.log(30, 'camstreamhandler got StopIteration %s terminated' %   str(self.client_address))
+                if running:
+                    try:
+                        self.wfile.write(b'--FRAME\r\n')
+                        self.send_header('Content-Type', conttype)
+                        self.send_header('Content-Length', datalen)
+                        self.end_headers()
+                        self.wfile.write(frame)
+                        self.wfile.write(b'\r\n')
+                    except BrokenPipeError:
+                        running=False
+            self.server.log(30, 'camstreamhandler client %s terminated using %s' %   (str(self.client_address), camstreaminfo))
+        except ConnectionError as ce:
+            self.server.log(30, 'camstreamhandler client connection lost %s' %  str(self.client_address))
+        except Exception as e:
+            self.server.log(30, 'camstreamhandler client %s crashed' %   (str(self.client_address)), exc_info=True, stack_info=True)
+        if not camstreaminfo is None:
+            camstreaminfo.streamends()
+
+    def _get_pushstream(self, requdata, queryparams, parsedpath):
+        """
+        runs an event stream that only sends data when one of a set of watchables changes.
+        
+        requdata is a dict with entries:
+            'func'      : function called (with qp and pp) to fetch the data to send (as for updatestream)
+            'kwargs'    : (optional) further keyword args for func
+            'watch'     : a list of watchables, or a function (called with qp and pp) that returns the list of watchables
+            'agents'    : (optional) list of agents whose changes trigger an update, defaults to all agents
+            'coalesce'  : (optional) seconds to wait after a change so bursts of changes are sent as one event, default 0.05
+            'heartbeat' : (optional) seconds of idle time after which a comment line is sent to keep the connection alive, default 15
+        """
+        func=requdata['func']
+        kwargs=requdata.get('kwargs',{})
+        watched=requdata['watch']
+        if callable(watched):
+            watched=self._do_datafetch(f=watched, qp=queryparams, pp=parsedpath)
+        newdata=None if watched is None else self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
+        if newdata is None:
+            self.server.log(logging.INFO, 'request fails with parsedpath >%s<' % str(parsedpath))
+            self.send_error(500)
+            return
+        coalesce=requdata.get('coalesce', .05)
+        heartbeat=requdata.get('heartbeat', 15)
+        waker=changewaker(watched, requdata.get('agents'))
+        try:
+            self._startstream(('Content-Type', 'text/event-stream; charset=utf-8'), ('Cache-Control', 'no-store'))
+            self.wfile.write(b'data: %s\n\n' % jsonser.dumpb(newdata))
+            while self.server.serverrunning:
+                if waker.waitchange(timeout=heartbeat, coalesce=coalesce):
+                    newdata=self._do_datafetch(f=func, qp=queryparams, pp=parsedpath, **kwargs)
+                    if newdata is None:
+                        break
+                    self.wfile.write(b'data: %s\n\n' % jsonser.dumpb(newdata))
+                else:
+                    self.wfile.write(b': idle\n\n')
+        except ConnectionError:
+            self.server.log(logging.INFO, 'pushstream client %s terminated' % str(self.client_address))
+        finally:
+            waker.close()
+
+    def do_POST(self):
+        parsedpath=urlparse(self.path)
+        aroute, pathparams = self.server.routes['POST'].match(parsedpath.path[1:])
+        if aroute is None:
+            if not 'POST' in self.server.config:
+                self.send_error(501, 'no POST list specified for this server')
+            else:
+                self.send_error(404, ('no page for %s' % self.path[1:]))
             return
+        queryparams={} if parsedpath.query=='' else parse_qs(parsedpath.query)
+        if pathparams:
+            queryparams.update((pn, [pv]) for pn, pv in pathparams.items())
+        aroute.handler(self, aroute.requdata, queryparams, parsedpath)
+
+    def _post_json(self, requdata, queryparams, parsedpath):
         th=self.headers['Content-Type']
         print('+++++++++++++', self.path)
         if th.startswith('application/json'):
@@ -334,48 +1275,122 @@ class httprequh(http.server.BaseHTTPRequestHandler):
                 print("HELEPELPELPELEPLEPELEPLE")
                 self.send_error(501,'oops')
                 return
-            parsedpath=urlparse(self.path)
-            pathlookup=parsedpath.path[1:]      # ditch the leading slash
-            if pathlookup in validrequs:
-                pathinf=validrequs[pathlookup]
-                jdata=json.loads(ddata.decode('utf-8'))
-                print(jdata.keys())
-                result=pathinf[0](pathinf[1], **jdata)
-                # result is a dict with:
-                #   resp: the response code - if 200 then good else bad
-                #   rdata: (only if resp==200) data (typically a dict) to json encode and return as the data
-                #   rmsg: (only if resp != 200) the message to return with the fail code
-                if result['resp']==200:
-                    datats=json.dumps(result['rdata'])
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json; charset=utf-8')
-                    self.end_headers()
-                    self.wfile.write(datats.encode('utf-8'))
-                else:
-                    self.send_error(result['resp'], result['rmsg'])
+            jdata=jsonser.loads(ddata)
+            print(jdata.keys())
+            result=requdata[0](requdata[1], **jdata)
+            # result is a dict with:
+            #   resp: the response code - if 200 then good else bad
+            #   rdata: (only if resp==200) data (typically a dict) to json encode and return as the data
+            #   rmsg: (only if resp != 200) the message to return with the fail code
+            if result['resp']==200:
+                datats=jsonser.dumpb(result['rdata'])
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', len(datats))
+                self.end_headers()
+                self.wfile.write(datats)
             else:
-                self.send_error(404, ('no page for %s' % self.path[1:]))
+                self.send_error(result['resp'], result['rmsg'])
         else:
-            self.send_error(500,'what is ' + th) 
+            self.send_error(500,'what is ' + th)
+
+    def _post_updatewvbatch(self, requdata, queryparams, parsedpath):
+        """
+        applies a batch of changes from a dynamic web page in one request, the POST entry in the config is:
+            'updatewvbatch': ('updatewvbatch', None)
+
+        The request body is json: {"p": <page id>, "updates": [[<target>, <value>], ...]}, the updates are applied in
+        order (see livepage.applybatch) and the response is json: {"OK": true, "results": [<result for each update>]}
+        where each result is as would be returned by updatewv for that update.
+
+        The web page can collect changes for a short time and send them together, for example:
+            var pending=[], timer=null;
+            function queueupdate(target, value) {
+                pending.push([target, value]);
+                if (timer===null) {timer=setTimeout(sendupdates, 100);}
+            }
+            function sendupdates() {
+                var batch=pending; pending=[]; timer=null;
+                fetch('updatewvbatch', {method: 'POST', headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({p: pageid, updates: batch})})
+                  .then(resp => resp.json()).then(rdata => rdata.results.forEach((res, ix) => showresult(batch[ix][0], res)));
+            }
+        """
+        try:
+            ddata=self.rfile.read(int(self.headers['Content-Length']))
+            batch=parsebatch(jsonser.loads(ddata))
+        except:
+            batch=None
+        if batch is None:
+            self.server.log(logging.WARN, 'invalid updatewvbatch request %s' % self.path)
+            self.send_error(400, 'invalid batch')
+            return
+        updatelist=self.server.activeupdates.get(batch[0])
+        if updatelist is None:
+            self.server.log(logging.ERROR, 'invalid pageid in batch request %s' % batch[0])
+            self.send_error(410, 'unknown update list key')
+            return
+        jdat=jsonser.dumpb({'OK': True, 'results': updatelist.applybatch(batch[1])})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', len(jdat))
+        self.end_headers()
+        self.wfile.write(jdat)
 
     def servestatic(self, statfile):
-        staticinf=self.server.config['staticroot']
-        staticfile=staticinf['path']/statfile
-        if staticfile.is_file():
-            try:
-                sfx=self.mimetypeforfile(staticfile.suffix)
-            except:
-                self.send_error(501, "no mime type found in server config['mimetypes'] for %s" % staticfile.suffix)
-                return
-            self.send_response(200)
-            self.send_header(*sfx)
-            with staticfile.open('rb') as sfile:
-                cont=sfile.read()
-                self.send_header('Content-Length', len(cont))
+        """
+        serves a file from the static folder - see staticresponse
+        """
+        self._sendresponse(staticresponse(self.server.config['staticroot'], statfile, self.headers, self.server.staticcache, self.mimetypeforfile))
+
+    def servefilerange(self, filepath, conttype):
+        """
+        sends a file (typically a video) supporting byte ranges so clients can seek within the file - see rangeresponse
+        """
+        try:
+            self._sendresponse(rangeresponse(filepath, self.headers, conttype))
+        except ConnectionError:
+            self.server.log(logging.INFO, 'range request client %s closed connection' % str(self.client_address))
+
+    def _sendresponse(self, response):
+        """
+        sends a response dict as returned by staticresponse or rangeresponse
+        """
+        if response['resp'] >= 400 and 'msg' in response:
+            self.send_error(response['resp'], response['msg'])
+            return
+        self.send_response(response['resp'])
+        for h in response.get('headers', []):
+            self.send_header(*h)
+        if 'file' in response:
+            fpath, offset, count, sendfilemin = response['file']
+            with fpath.open('rb') as fo:
+                self.send_header('Content-Length', count)
                 self.end_headers()
-                self.wfile.write(cont)
+                self.sendfilepart(fo, offset, count, sendfilemin)
+        elif 'data' in response:
+            self.send_header('Content-Length', len(response['data']))
+            self.end_headers()
+            self.wfile.write(response['data'])
+        else:
+            self.end_headers()
+
+    def sendfilepart(self, fileob, offset, count, sendfilemin=0):
+        """
+        sends count bytes from the open (binary) file fileob starting at offset.
+        
+        If count is at least sendfilemin the data is sent with socket.sendfile (which uses os.sendfile where
+        available) so the data is not copied through python, otherwise it is read and written in one go.
+        """
+        if count <= 0:
+            return
+        if count >= sendfilemin:
+            self.wfile.flush()
+            self.connection.sendfile(fileob, offset, count)
         else:
-            self.send_error(404, 'file %s not present or not a file' % str(staticfile))
+            fileob.seek(offset)
+            self.wfile.write(fileob.read(count))
 
     def mimetypeforfile(self, fileext):
         return {
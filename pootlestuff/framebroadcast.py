@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+"""
+This module provides a broadcaster that shares a single frame source (typically a camera) between any number
+of 'camstream' clients in basichttpserver.
+
+Without it each viewer calls the source factory and pulls (and encodes) its own frames. With it a single producer
+thread pulls frames from the source and holds only the latest one. Each client thread picks up the latest frame
+(the same bytes object - no copies are made), so a slow client simply misses frames rather than holding up the
+producer or the other clients.
+
+A framebroadcaster is used in place of the source factory in the server config, for example:
+
+    'camera': ('camstream', framebroadcaster(source=mycam.startstream))
+
+where mycam.startstream returns an object with methods nextframe() and streamends() as expected by camstream.
+"""
+import threading
+
+class framebroadcaster():
+    """
+    shares frames from a single source between multiple clients.
+
+    The source is started when the first client connects, and stopped once the last client has gone.
+    """
+    def __init__(self, source, name='broadcaster'):
+        """
+        source  : a callable that returns a frame source object with methods:
+                    nextframe()  : returns a 3-tuple (frame, content type, frame length) - raises StopIteration when the source ends
+                    streamends() : called when the source is no longer required
+                  The callable can raise StopIteration if there is no source available.
+
+        name    : name used for the producer thread
+        """
+        self.source=source
+        self.name=name
+        self.lock=threading.Lock()
+        self.newframe=threading.Condition(self.lock)
+        self.frame=None
+        self.seq=0          # incremented for each new frame
+        self.runs=0         # incremented each time the source is started, so clients can tell they belong to a finished run
+        self.running=False
+        self.clients=[]
+
+    def __call__(self):
+        """
+        called by the camstream handler for each new client, returns a new client object
+        """
+        with self.lock:
+            if not self.running:
+                stream=self.source()
+                self.running=True
+                self.runs+=1
+                self.frame=None
+                threading.Thread(name=self.name, target=self._produce, args=(stream, self.runs), daemon=True).start()
+            client=broadcastclient(self)
+            self.clients.append(client)
+        return client
+
+    def _produce(self, stream, run):
+        try:
+            while True:
+                with self.lock:
+                    if not self.clients:
+                        self._endrun(run)   # ended while holding the lock, so a new client starts a new run
+                        break
+                try:
+                    frameinf=stream.nextframe()
+                except StopIteration:
+                    break
+                with self.newframe:
+                    self.frame=frameinf
+                    self.seq+=1
+                    self.newframe.notify_all()
+                    waiting=[cl.onframe for cl in self.clients if not cl.onframe is None]
+                for onframe in waiting:
+                    onframe()
+        finally:
+            with self.newframe:
+                waiting=self._endrun(run)
+            for onframe in waiting:
+                onframe()
+            stream.streamends()
+
+    def _endrun(self, run):
+        """
+        marks the given run as finished and wakes its clients - call with the lock held. Does nothing if a new client
+        has already started another run, or it has been done already.
+        
+        returns the onframe functions to call (after releasing the lock)
+        """
+        if self.runs!=run or not self.running:
+            return []
+        self.running=False
+        self.newframe.notify_all()
+        return [cl.onframe for cl in self.clients if not cl.onframe is None]
+
+    def dropclient(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def clientstats(self):
+        """
+        returns a list of dicts, one for each current client, with counts of frames sent to and frames dropped
+        for that client
+        """
+        with self.lock:
+            return [{'sent': cl.sent, 'dropped': cl.dropped} for cl in self.clients]
+
+class broadcastclient():
+    """
+    The per client view of a framebroadcaster. Provides the nextframe and streamends methods used by the camstream
+    handler, and keeps counts of frames sent and frames dropped because the client was not ready for them.
+    """
+    def __init__(self, bcast):
+        self.bcast=bcast
+        self.run=bcast.runs
+        self.lastseq=bcast.seq if bcast.frame is None else bcast.seq-1     # start with the current frame if there is one
+        self.sent=0
+        self.dropped=0
+        self.onframe=None   # if set, called (in the producer thread) after each new frame and when the source ends
+
+    def nextframe(self, timeout=None):
+        """
+        returns the latest frame as a 3-tuple (frame, content type, frame length), waiting for a new frame if this
+        client has already had the latest one.
+
+        raises StopIteration if the source has ended or the timeout expires.
+        """
+        bc=self.bcast
+        with bc.newframe:
+            if bc.seq==self.lastseq and bc.running and bc.runs==self.run:
+                bc.newframe.wait_for(lambda: bc.seq!=self.lastseq or not bc.running or bc.runs!=self.run, timeout)
+            if bc.runs!=self.run or bc.seq==self.lastseq:
+                raise StopIteration()
+            self.dropped+=bc.seq-self.lastseq-1
+            self.lastseq=bc.seq
+            frameinf=bc.frame
+        self.sent+=1
+        return frameinf
+
+    def pollframe(self):
+        """
+        non-blocking version of nextframe, for use with onframe. Returns None if this client has already had the latest frame.
+
+        raises StopIteration if the source has ended.
+        """
+        bc=self.bcast
+        with bc.lock:
+            if bc.runs==self.run and bc.seq==self.lastseq and bc.running:
+                return None
+        return self.nextframe(timeout=0)
+
+    def streamends(self):
+        self.bcast.dropclient(self)
+
+    def __repr__(self):
+        return '%s(sent=%d, dropped=%d)' % (type(self).__name__, self.sent, self.dropped)
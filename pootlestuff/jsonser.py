@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""
+This module provides the json encoding and decoding used by basichttpserver, asynchttpserver and watchables.
+
+If orjson or ujson can be imported it is used, otherwise the standard library json module is used. The encoders
+differ slightly: orjson writes NaN and infinity as null (the standard library writes NaN, which browsers reject).
+Anything the faster encoder can't handle (for example integers over 64 bits) is passed to the standard library.
+
+Encoding always returns bytes (ready to send), with orjson there is no intermediate str at all.
+
+Values that are already encoded can be wrapped in a jsonfragment, which is inserted as is. Watchables can be used
+directly as values. They keep their encoded value (see watchable.jsonbytes) so without orjson, a page with many
+values only encodes the ones that have changed. orjson encodes the current values directly as that is quicker still.
+"""
+import json, functools
+
+try:
+    import orjson
+except ImportError:
+    orjson=None
+
+try:
+    import ujson
+except ImportError:
+    ujson=None
+
+class jsonfragment():
+    """
+    holds json that is already encoded (as bytes), so it can be included in the output of dumpb or dumpitems
+    without being decoded and encoded again.
+    """
+    __slots__=('jbytes',)
+
+    def __init__(self, jbytes):
+        self.jbytes=jbytes
+
+    def __repr__(self):
+        return 'jsonfragment(%r)' % self.jbytes
+
+def _stddumpb(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+if not orjson is None:
+    backend='orjson'
+    def _default(obj):
+        # watchables are encoded as their value, orjson does this quicker than cached fragments can be joined
+        if hasattr(obj, 'jsonbytes'):
+            return obj.getValue()
+        if isinstance(obj, jsonfragment) and hasattr(orjson, 'Fragment'):
+            return orjson.Fragment(obj.jbytes)
+        raise TypeError('%s is not json serializable' % type(obj).__name__)
+    def _fastdumpb(data):
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    loads=orjson.loads
+elif not ujson is None:
+    backend='ujson'
+    def _fastdumpb(data):
+        return ujson.dumps(data, ensure_ascii=False).encode()
+    loads=ujson.loads
+else:
+    backend='json'
+    _fastdumpb=_stddumpb
+    loads=json.loads
+
+@functools.lru_cache(maxsize=4096)
+def _encodekey(key):
+    return _fastdumpb(key)
+
+def _isfragment(value):
+    return isinstance(value, jsonfragment) or hasattr(value, 'jsonbytes')
+
+def _encodevalue(value):
+    if isinstance(value, jsonfragment):
+        return value.jbytes
+    if hasattr(value, 'jsonbytes'):
+        return value.jsonbytes()
+    return dumpb(value)
+
+def dumpb(data):
+    """
+    returns data encoded as json (bytes).
+
+    data    : anything json can encode. If data is a dict, list or tuple, its values (only at this top level) can be
+              jsonfragments or watchables (which are encoded with their jsonbytes method).
+    """
+    try:
+        return _fastdumpb(data)
+    except (TypeError, OverflowError, ValueError):
+        pass    # fragments, watchables and anything else the faster encoder can't handle end up here
+    if isinstance(data, dict) and any(_isfragment(v) for v in data.values()):
+        return b'{' + b','.join([b'%s:%s' % (_encodekey(str(k)), _encodevalue(v)) for k, v in data.items()]) + b'}'
+    if isinstance(data, (list, tuple)) and any(_isfragment(v) for v in data):
+        return b'[' + b','.join([_encodevalue(v) for v in data]) + b']'
+    return _stddumpb(data)
+
+def dumpitems(items):
+    """
+    returns a json array (bytes) of [key, value] pairs, as used for page updates.
+
+    items   : iterable of (key, value) pairs, the keys are strings. A value can be a jsonfragment or a watchable (which
+              is encoded with its jsonbytes method), so unchanged values are not encoded again.
+    """
+    if backend=='orjson':
+        try:
+            return _fastdumpb([[k, v] for k, v in items])
+        except TypeError:
+            pass
+    return b'[' + b','.join([b'[%s,%s]' % (_encodekey(k), _encodevalue(v)) for k, v in items]) + b']'
+
+def load(fileob):
+    """
+    reads and decodes json from an open (settings) file. As with dumpfile the standard library is always used, so
+    values it writes (such as NaN and Infinity, which orjson rejects) can be read back.
+    """
+    return json.loads(fileob.read())
+
+def dumpfile(data, fileob, indent=4):
+    """
+    writes data as indented json to an open (text) file, used for settings files that people may want to read.
+    The standard library encoder is always used so the layout doesn't depend on which encoder is installed.
+    """
+    fileob.write(json.dumps(data, indent=indent))
@@ -3,6 +3,8 @@
 This module provides a class for node based trees, the class provided can be used as a base or mixin
 for hierarchical object trees.
 
+slimtreeob is a compact alternative to treeob, with the same api, for trees with very many nodes (see below).
+
 The primary class inherits from OrderedDict, so child nodes can be selected using standard dict notation.
 In addition __getitem__ is redefined to allow filesystem like navigation using '..' and '/'. This does mean
 nodenames are expected to be strings and that '/'  and '..' can't be used as part of node names.
@@ -10,46 +12,61 @@ nodenames are expected to be strings and that '/'  and '..' can't be used as par
 In addition (because it is based on OrderedDict) slices of the node's children can be extracted. Note though that
 this returns a straight OrderedDict of the children, not a new instance of the originating class (trying to 
 return a new treeob would imply nodes having multiple parents which is a whole new level of complexity!)
+Slices follow the same rules as list slices. For nodes with many children sliceview returns a lazy view of a slice
+instead, and child_at and index_of give positional access to the children.
 
 Examples:
     node['childx']      - returns the child node named 'childx' of the current node.
     node['../siblingx'] - returns the sibling node named 'siblingx' of the current node - that is the 
                           child node 'siblingx' of the parent of the current node.
     node[1:-3]          returns an OrderedDict of the second to (last-3) children of this node
+    node.sliceview(0,50)- returns a treeslice, a read only mapping of the first 50 children which is not copied
+    node.child_at(-1)   - returns the last child of this node
+    node.index_of('x')  - returns the position of child 'x' in this node
+
+Large trees can be built from a treeplan, which flattens the nested childdefs once, so the nodes are made in a single
+loop with the garbage collector paused (and the same plan can be used for many trees or subtrees).
+
+Paths (names including '/' or '..') are resolved once and the result kept in a small cache on the node the lookup
+starts from, and each node remembers its hierarchic name. The root node holds a generation count which is incremented
+whenever a child is replaced or removed anywhere in the tree, and this discards all the cached paths and names. Adding
+a new child cannot change a path already found, so it leaves the caches alone. The caches are only set up on a node
+when first used, so building a tree costs little more than it did before they were added.
+
+For positional access each node keeps a list of its child names, with a dict of name -> position. These are built
+when first needed, extended with any children added since when next used, and dropped when a child is removed or the
+order changes, so paging through a node with many children does not copy the names for each page.
 """
 
-from collections import Hashable
+import gc
+from collections.abc import Hashable, Mapping, MutableMapping
 from collections import OrderedDict
+from itertools import islice
 
-class treeob(OrderedDict):
+class treenav():
     """
-    A class that places an object within a tree. Each node is basically a dict (empty for leaf nodes)
+    The navigation methods shared by treeob and slimtreeob - path lookup, slicing, positional access and hierarchic
+    names. Classes using this provide _getchild (fetch a child by its plain name, raising KeyError if not found),
+    keys, _addchild (adds a child with a new name, used by the constructors) and the methods that add and remove
+    children, which must call _treechanged when a child is replaced or removed.
     """
+    __slots__=()
+
     hiernamesep='/'
-    
-    def __init__(self, *, name, parent, app, childdefs=None): # * forces all args to be used as keywords
-        """
-        Creates a node and links it from the parent (if present)
 
-        name        : a hashable name for the node
-        
-        parent      : if not None, then the child will be added as an offspring of this parent
-        
-        app         : the top parent (root node) of the tree, can hold various tree constant info, None only
-                      for the root node itself.
-        
-        childdefs   : iterable of definitions for child nodes, each to be the kwargs for calling makeChild
+    _pathcache=None     # dict of path -> node, created on first use, valid while _pathgen matches the root's _treegen
+    _pathgen=-1
+    _hiername=None      # (generation, hierarchic name) - set by getHierName
+    _keylist=None       # list of child names in order, built by _keyindex when needed
+    _keypos=None        # dict of child name -> position in _keylist
 
-        raises ValueError is the parent already has a child with this name, or if the name is not Hashable
+    def _makechildren(self, childdefs):
         """
-        assert isinstance(name, Hashable), 'the name given for variable {} is not hashable'.format(name)
-        self.name=name
-        self.parent=parent
-        self.app=self if app is None else app
-        super().__init__()
-        if not parent is None:
-            parent[self.name]=self
-        if not childdefs is None:
+        creates this node's children (and their children...) from childdefs (see the constructor)
+        """
+        if isinstance(childdefs, treeplan):
+            childdefs.build(self)
+        else:
             for cdef in childdefs:
                 self.makeChild(**cdef)
 
@@ -66,7 +83,7 @@ class treeob(OrderedDict):
         try:
             return _cclass(parent=self, app=self.app, **kwargs)
         except:
-            print('makeChild failed with params', cdef, 'in', self.getHierName())
+            print('makeChild failed with params', kwargs, 'in', self.getHierName())
             raise
 
     def __getitem__(self, nname):
@@ -74,36 +91,27 @@ class treeob(OrderedDict):
         redefine __getitem_- to parse use slices or a string for filesystem like syntax.
         """
         if isinstance(nname, slice): # first handle the slice case
-            keys=list(self.keys())
-            kl=len(keys)
-            if nname.start is None:
-                start = 0 if nname.step is None or nname.step > 0 else kl-1
-            else:
-                start = nname.start if nname.start >=0 else nname.start+kl
-                if start < 0:
-                    start=0
-                elif start >= kl:
-                    start=kl
-            if nname.stop is None:
-                stop=kl if nname.step is None or nname.step > 0 else -1
-            else:
-                stop=nname.stop if nname.stop >=0 else nname.stop+kl
-                if stop < 0:
-                    stop=0
-                elif stop >= kl:
-                    stop=kl
-            rr=range(start, stop) if nname.step is None else range(start,stop,nname.step)
-            return OrderedDict(((keys[ix], self[keys[ix]]) for ix in rr))
+            keys=self._keyindex()[0]
+            getch=self._getchild
+            return OrderedDict(((keys[ix], getch(keys[ix])) for ix in range(len(keys))[nname]))
 
         if hasattr(nname, 'split'):  # do a simple test to see if nname is string like
-            splitname=nname.split(self.hiernamesep)
-            if len(splitname)==1:
+            if not self.hiernamesep in nname:
                 try:
-                    return super().__getitem__(nname)
+                    return self._getchild(nname)
                 except KeyError:
                     raise KeyError('key %s not found in %s' % (nname, str(self.keys())))
+            pcache=self._pathcache
+            if pcache is None or self._pathgen!=self.app._treegen or len(pcache) >= 1000:
+                pcache={}
+                self._pathcache=pcache
+                self._pathgen=self.app._treegen
+            else:
+                cnode=pcache.get(nname)
+                if not cnode is None:
+                    return cnode
             cnode=self
-            for pname in splitname:
+            for pname in nname.split(self.hiernamesep):
                 if pname=='':
                     cnode=self.app
                 elif pname=='..':
@@ -113,9 +121,66 @@ class treeob(OrderedDict):
                         cnode=cnode.__getitem__(pname)
                     except KeyError:
                         raise KeyError('key %s not found in %s' % (pname, str(cnode.keys())))
+            pcache[nname]=cnode
             return cnode
 
-        return super().__getitem__(nname)   # if all else fails, treat as a simple key
+        return self._getchild(nname)   # if all else fails, treat as a simple key
+
+    def _keyindex(self):
+        """
+        returns the list of child names and the dict of name -> position, building or extending them if necessary
+        """
+        keylist=self._keylist
+        if not keylist is None and len(keylist)!=len(self):
+            added=len(self)-len(keylist)
+            if added > 0:   # new children go at the end, so just add their names
+                keypos=self._keypos
+                for k in reversed(list(islice(reversed(self.keys()), added))):
+                    keypos[k]=len(keylist)
+                    keylist.append(k)
+            else:
+                keylist=None
+        if keylist is None:
+            keylist=list(self.keys())
+            self._keypos={k: ix for ix, k in enumerate(keylist)}
+            self._keylist=keylist
+        return keylist, self._keypos
+
+    def child_at(self, index):
+        """
+        returns the child at the given position (negative values count back from the end as for lists)
+
+        raises IndexError if there is no such position
+        """
+        return self._getchild(self._keyindex()[0][index])
+
+    def index_of(self, name):
+        """
+        returns the position of the named child in this node
+
+        raises KeyError if there is no such child
+        """
+        try:
+            return self._keyindex()[1][name]
+        except KeyError:
+            raise KeyError('key %s not found in %s' % (name, self.getHierName())) from None
+
+    def sliceview(self, start=None, stop=None, step=None):
+        """
+        returns a treeslice - a read only mapping of the children in the slice (same rules as for list slices) without
+        copying them. The view uses the positions current when it is used, not when it was made.
+        """
+        return treeslice(self, slice(start, stop, step))
+
+    def _treechanged(self, reorder=True):
+        """
+        called when a child of this node is replaced or removed, invalidates all cached paths and names in the tree,
+        and if reorder is True, this node's positional index
+        """
+        self.app._treegen+=1
+        if reorder:
+            self._keylist=None
+            self._keypos=None
 
     def getHierName(self):
         """
@@ -123,10 +188,11 @@ class treeob(OrderedDict):
         
         Returns a string using hiernamesep to separate each ancestor's name. 
         """
-        if self.parent is None:
-            return ''
-        else:
-            return self.parent.getHierName()+self.hiernamesep+self.name
+        hname=self._hiername
+        if hname is None or hname[0]!=self.app._treegen:
+            hname=(self.app._treegen, '' if self.parent is None else self.parent.getHierName()+self.hiernamesep+self.name)
+            self._hiername=hname
+        return hname[1]
 
     def __repr__(self):
         """
@@ -135,4 +201,326 @@ class treeob(OrderedDict):
         if len(self.keys()) == 0:
             return "{} name={}".format(self.__class__.__name__, self.name)
         else:
-            return "{} name={}, children {}".format(self.__class__.__name__, self.name, list(self.keys()))
\ No newline at end of file
+            return "{} name={}, children {}".format(self.__class__.__name__, self.name, list(self.keys()))
+
+class treeob(treenav, OrderedDict):
+    """
+    A class that places an object within a tree. Each node is basically a dict (empty for leaf nodes)
+    """
+
+    def __init__(self, *, name, parent, app, childdefs=None): # * forces all args to be used as keywords
+        """
+        Creates a node and links it from the parent (if present)
+
+        name        : a hashable name for the node
+        
+        parent      : if not None, then the child will be added as an offspring of this parent
+        
+        app         : the top parent (root node) of the tree, can hold various tree constant info, None only
+                      for the root node itself.
+        
+        childdefs   : iterable of definitions for child nodes, each to be the kwargs for calling makeChild, or a
+                      treeplan made from such definitions
+
+        raises ValueError is the parent already has a child with this name, or if the name is not Hashable
+        """
+        assert isinstance(name, Hashable), 'the name given for variable {} is not hashable'.format(name)
+        self.name=name
+        self.parent=parent
+        if app is None:
+            self.app=self
+            self._treegen=0     # incremented whenever the tree structure changes - see _treechanged
+        else:
+            self.app=app
+        # OrderedDict.__init__ only adds initial items, so it is not called - this saves time on big trees
+        if not parent is None:
+            if name in parent:
+                parent[name]=self   # replaces the existing child
+            else:
+                parent._addchild(name, self)
+        if not childdefs is None:
+            self._makechildren(childdefs)
+
+    _getchild=OrderedDict.__getitem__
+
+    _addchild=OrderedDict.__setitem__
+
+    def __setitem__(self, key, value):
+        replacing=key in self
+        super().__setitem__(key, value)
+        if replacing:
+            self._treechanged(reorder=False)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._treechanged()
+
+    def pop(self, *args):
+        try:
+            return super().pop(*args)
+        finally:
+            self._treechanged()
+
+    def popitem(self, last=True):
+        try:
+            return super().popitem(last)
+        finally:
+            self._treechanged()
+
+    def clear(self):
+        super().clear()
+        self._treechanged()
+
+    def move_to_end(self, key, last=True):
+        super().move_to_end(key, last)
+        self._treechanged()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self._getchild(key)
+        self[key]=default
+        return default
+
+class slimtreeob(treenav, MutableMapping):
+    """
+    A compact alternative to treeob for large trees. It has the same constructor, path, slicing and positional api,
+    but it is not an OrderedDict:
+        the node's attributes use __slots__ so there is no per instance __dict__ (unless a subclass adds one)
+        the children are held in a plain dict (which keeps the insertion order) that is only created when the first
+            child is added, so leaf nodes have no child dict at all
+    """
+    __slots__=('name', 'parent', 'app', '_children', '_treegen', '_pathcache', '_pathgen', '_hiername', '_keylist', '_keypos')
+
+    def __init__(self, *, name, parent, app, childdefs=None):
+        """
+        see treeob
+        """
+        assert isinstance(name, Hashable), 'the name given for variable {} is not hashable'.format(name)
+        self.name=name
+        self.parent=parent
+        if app is None:
+            self.app=self
+            self._treegen=0
+        else:
+            self.app=app
+        self._children=None
+        self._pathcache=None    # the slots hide treenav's class level defaults so are set here
+        self._pathgen=-1
+        self._hiername=None
+        self._keylist=None
+        self._keypos=None
+        if not parent is None:
+            if name in parent:
+                parent[name]=self   # replaces the existing child
+            else:
+                parent._addchild(name, self)
+        if not childdefs is None:
+            self._makechildren(childdefs)
+
+    def _getchild(self, key):
+        children=self._children
+        if children is None:
+            raise KeyError(key)
+        return children[key]
+
+    def _addchild(self, key, value):
+        children=self._children
+        if children is None:
+            self._children={key: value}
+        else:
+            children[key]=value
+
+    def __setitem__(self, key, value):
+        children=self._children
+        if children is None:
+            self._children={key: value}
+        elif key in children:
+            children[key]=value
+            self._treechanged(reorder=False)
+        else:
+            children[key]=value
+
+    def __delitem__(self, key):
+        if self._children is None:
+            raise KeyError(key)
+        del self._children[key]
+        self._treechanged()
+
+    def __contains__(self, key):
+        return not self._children is None and key in self._children
+
+    def __len__(self):
+        return 0 if self._children is None else len(self._children)
+
+    def __iter__(self):
+        return iter(() if self._children is None else self._children)
+
+    def keys(self):
+        return ({} if self._children is None else self._children).keys()
+
+    def values(self):
+        return ({} if self._children is None else self._children).values()
+
+    def items(self):
+        return ({} if self._children is None else self._children).items()
+
+    def get(self, key, default=None):
+        return default if self._children is None else self._children.get(key, default)
+
+    _nodefault=object()
+
+    def pop(self, key, default=_nodefault):
+        if self._children is None or not key in self._children:
+            if default is slimtreeob._nodefault:
+                raise KeyError(key)
+            return default
+        value=self._children.pop(key)
+        self._treechanged()
+        return value
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self._children[key]
+        self[key]=default
+        return default
+
+    def popitem(self, last=True):
+        if not self._children:
+            raise KeyError('%s has no children' % self.getHierName())
+        key=next(reversed(self._children)) if last else next(iter(self._children))
+        return key, self.pop(key)
+
+    def clear(self):
+        self._children=None
+        self._treechanged()
+
+    def move_to_end(self, key, last=True):
+        """
+        as for OrderedDict.move_to_end
+        """
+        children=self._children
+        if children is None or not key in children:
+            raise KeyError(key)
+        if last:
+            children[key]=children.pop(key)
+        else:
+            self._children={key: children[key]}
+            self._children.update((k, v) for k, v in children.items() if k!=key)
+        self._treechanged()
+
+class treeplan():
+    """
+    A construction plan for a (sub)tree, made once from a list of childdefs (as used by treeob's constructor, where
+    each def can have its own childdefs) and then used to build the tree as often as required.
+    
+    The nested defs are flattened into a list of steps in the order the nodes would be made by the constructors, so
+    the tree is built in a single loop rather than by each node's constructor in turn. Each node is made by calling its
+    class directly, not via its parent's makeChild.
+    
+    A plan can be passed as childdefs to a node's constructor, or used to add children to an existing node with build.
+    """
+    def __init__(self, childdefs):
+        """
+        childdefs   : iterable of dicts, each with the kwargs for makeChild (including _cclass) and optionally
+                      'childdefs' for the node's own children
+        """
+        self.steps=[]   # list of (index of parent in the list of nodes being built, class, kwargs)
+        pending=[(0, iter(childdefs))]
+        while pending:
+            pix, defs = pending[-1]
+            cdef=next(defs, None)
+            if cdef is None:
+                pending.pop()
+            else:
+                kwargs=dict(cdef)
+                subdefs=kwargs.pop('childdefs', None)
+                self.steps.append(self.makestep(pix, kwargs.pop('_cclass'), kwargs))
+                if subdefs:
+                    pending.append((len(self.steps), iter(subdefs)))
+
+    def makestep(self, pix, cclass, kwargs):
+        """
+        returns the step for a single node, subclasses can extend this to prepare extra info
+        """
+        return (pix, cclass, kwargs)
+
+    def build(self, parent, **kwargs):
+        """
+        makes the nodes in the plan as children (and descendants) of parent, returns parent
+
+        The cyclic garbage collector is paused while the nodes are made. Every node made stays in the tree, and with
+        many nodes the repeated collections as the tree grows can take as long as making the nodes.
+
+        kwargs are passed to makenodes
+        """
+        gcwason=gc.isenabled()
+        gc.disable()
+        try:
+            return self.makenodes(parent, **kwargs)
+        finally:
+            if gcwason:
+                gc.enable()
+
+    def makenodes(self, parent):
+        """
+        makes the nodes for build, subclasses can override this to pass extra info to the constructors
+        """
+        nodes=[parent]
+        app=parent.app
+        try:
+            for pix, cclass, kwargs in self.steps:
+                nodes.append(cclass(parent=nodes[pix], app=app, **kwargs))
+        except:
+            print('treeplan failed making node with params', self.steps[len(nodes)-1][2], 'in', nodes[self.steps[len(nodes)-1][0]].getHierName())
+            raise
+        return parent
+
+    def __len__(self):
+        return len(self.steps)
+
+class treeslice(Mapping):
+    """
+    A read only view of a slice of a treeob's children, returned by treeob.sliceview. Iterating the view gives the
+    child names in order, and the children can be fetched by name as usual.
+    """
+    def __init__(self, node, aslice):
+        self.node=node
+        self.slice=aslice
+
+    def _range(self):
+        keylist, keypos=self.node._keyindex()
+        return range(len(keylist))[self.slice], keylist, keypos
+
+    def __len__(self):
+        return len(self._range()[0])
+
+    def __iter__(self):
+        rr, keylist, keypos = self._range()
+        for ix in rr:
+            yield keylist[ix]
+
+    def __contains__(self, name):
+        rr, keylist, keypos = self._range()
+        return keypos.get(name, -1) in rr
+
+    def __getitem__(self, name):
+        if not name in self:
+            raise KeyError('key %s not in this slice of %s' % (name, self.node.getHierName()))
+        return self.node._getchild(name)
+
+    def items(self):
+        """
+        returns an iterator over (name, child) pairs of the children in the slice
+        """
+        rr, keylist, keypos = self._range()
+        getch=self.node._getchild
+        return ((keylist[ix], getch(keylist[ix])) for ix in rr)
+
+    def values(self):
+        """
+        returns an iterator over the children in the slice
+        """
+        return (child for name, child in self.items())
+
+    def __repr__(self):
+        return '{}({}, {})'.format(type(self).__name__, self.node.name, self.slice)
@@ -11,7 +11,7 @@ This base set of Var classes provide core functionality.
 
 Vars form a tree structure (single parent nodes), so each Var has a parent except the top of the tree which has no parent.
 """
-import logging, sys, pathlib
+import logging, sys, pathlib, functools
 from collections import OrderedDict
 from enum import Enum
 from inspect import signature
@@ -26,6 +26,25 @@ class loglvls(Enum):
     FATAL   = logging.FATAL
     NONE    = 0
 
+@functools.lru_cache(maxsize=1024)
+def _notifyparamsok(func):
+    sig = signature(func)
+    return 'var' in sig.parameters and 'agent' in sig.parameters and 'oldValue' in sig.parameters and 'newValue' in sig.parameters
+
+def hasnotifyparams(func):
+    """
+    returns True if func has the named parameters needed by a notification function (see baseVar.addNotify).
+    
+    The result is cached, so wiring many vars to the same few functions only inspects each function once. For
+    bound methods the result is cached for the underlying function.
+    """
+    ufunc=getattr(func, '__func__', func)
+    try:
+        hash(ufunc)
+    except TypeError:
+        return _notifyparamsok.__wrapped__(ufunc)
+    return _notifyparamsok(ufunc)
+
 class groupVar(ptree.treeob):
     """
     the base for all things made of multiple fields
@@ -85,9 +104,10 @@ class groupVar(ptree.treeob):
         """
         uses the value dict to update the value of all children, value can contain a subset of the children
         """
-        if agent in self.app.agents:
+        if agent in self.app.agentbits:
             if isinstance(value, loglvls):
-                self.loglvl=value.value
+                self.loglvl=1000 if value is loglvls.NONE else value.value
+                return
             for n, v in value.items():
                 assert n in self
                 self.setValue(v, agent)
@@ -98,7 +118,9 @@ class groupVar(ptree.treeob):
         return "{} is a {}".format(self.name, type(self).__name__)
 
     def log(self, level, *args, **kwargs):
-        if (isinstance(level,loglvls) and level.value >= self.loglvl) or level >= self.loglvl:
+        if isinstance(level, loglvls):
+            level=level.value
+        if level >= self.loglvl:
             self.app.log(level, *args, **kwargs)
 
 class rootVar(groupVar):
@@ -109,9 +131,11 @@ class rootVar(groupVar):
         if len(agentlist) == 0:
             raise ValueError('agent list cannot be empty')
         self.agents=agentlist
+        self.agentbits={agent: 1 << ix for ix, agent in enumerate(agentlist)}   # each agent's bit in notification masks
         self.logformat=logformat
         if loglvl is None or loglvl is loglvls.NONE:
             self.loglvl=1000
+            self.logger=None
         else:
             self.logger=logging.getLogger(__loader__.name+'.'+type(self).__name__)
             self.loglvl=loglvl.value if isinstance(loglvl, loglvls) else loglvl
@@ -122,6 +146,43 @@ class rootVar(groupVar):
         if self.logger:
             self.logger.log(level, msg, *args, **kwargs)
 
+class varplan(ptree.treeplan):
+    """
+    A treeplan for trees of Vars. The initial values are handled as groupVar.makeChild does, a value for a child
+    in its group's value dict is used in preference to the value in the child's definition.
+    
+    As with treeplan, a varplan can be passed as childdefs to a groupVar (or rootVar) constructor.
+    """
+    def makestep(self, pix, cclass, kwargs):
+        value=kwargs.pop('value', None)
+        return (pix, cclass, kwargs, kwargs['name'], value, issubclass(cclass, (groupVar, baseVar)), issubclass(cclass, groupVar))
+
+    def makenodes(self, parent, value=None):
+        """
+        makes the Vars in the plan as children (and descendants) of parent, returns parent
+
+        value   : dict of values for the children, by default the value passed to parent's constructor
+        """
+        nodes=[parent]
+        values=[getattr(parent, 'prevals', None) if value is None else value]     # the value dict for each group made
+        app=parent.app
+        try:
+            for pix, cclass, kwargs, name, defvalue, isvar, isgroup in self.steps:
+                pvals=values[pix]
+                if isvar and pvals and name in pvals:
+                    if not defvalue is None:
+                        print('WARNING preval is %s value is %s for child %s' % (pvals[name], defvalue, name))
+                    cvalue=pvals[name]
+                else:
+                    cvalue=defvalue
+                nodes.append(cclass(parent=nodes[pix], app=app, value=cvalue, **kwargs))
+                values.append(cvalue if isgroup else None)
+        except:
+            step=self.steps[len(nodes)-1]
+            print('child constructor fails for xxVar (%s) in (%s), with params %s' % (step[3], nodes[step[0]].getHierName(), step[2]))
+            raise
+        return parent
+
 class baseVar(ptree.treeob):
     """
     A base class for single named variables with additional info that enables forms to be easily assembled.
@@ -165,6 +226,8 @@ class baseVar(ptree.treeob):
                                          # via _getVar / _setVar
         super().__init__(**kwargs)
         self.onChange={}                # setup empty notify set then set the value before adding notifications
+        self._notifiers=()              # tuple of (agent mask, func) in the order added
+        self._dispatch=None             # dict of agent -> tuple of the funcs to call, None if there are none - see _setdispatch
         self.enabled=enabled
         self.setInitialValue(value, fallbackValue)
         if not filters is None:
@@ -203,66 +266,93 @@ class baseVar(ptree.treeob):
         
         raises: ValueError for various inconsistencies in the parameters
         """
-        if isinstance(agents,str):
-            if agents=='*':
-                self.addNotify(func, self.app.agents)
-                return
-            if not agents in self.app.agents:
-                raise ValueError('the agent {} requested in addNotify for var of type {} is not known to this tree -{}'.format(
-                    agents, type(self).__name__, self.app.agents))
-            if isinstance(func,str):
-                try:
-                    f=getattr(self.app, func)
-                except AttributeError:
-                    raise ValueError('the function {} requested in addNotify for var of type {} is not a member of the app {}'.format(
-                    func, type(self).__name__, type(self.app).__name__))
-            else:
-                f=func
-            if callable(f):
-                sig = signature(f)
-                if 'var' in sig.parameters and 'agent' in sig.parameters and 'oldValue' in sig.parameters and 'newValue' in sig.parameters:
-                    if agents in self.onChange:
-                        self.onChange[agents].append(f)
-                    else:
-                        self.onChange[agents]=[f]
+        mask=self.agentmask(agents, 'addNotify')
+        if isinstance(func,str):
+            try:
+                f=getattr(self.app, func)
+            except AttributeError:
+                raise ValueError('the function {} requested in addNotify for var of type {} is not a member of the app {}'.format(
+                func, type(self).__name__, type(self.app).__name__))
+        else:
+            f=func
+        if not callable(f):
+            raise ValueError("the 'func' parameter ({}) for var of type {} is not callable".format(f, type(self).__name__))
+        if not hasnotifyparams(f):
+            raise ValueError("the function {} does not have named parameters ('var' and/or  'agent') for of type {}".format(
+                f.__name__, type(self).__name__))
+        for agent, bit in self.app.agentbits.items():
+            if mask & bit:
+                if agent in self.onChange:
+                    self.onChange[agent].append(f)
                 else:
-                    raise ValueError("the function {} does not have named parameters ('var' and/or  'agent') for of type {}".format(
-                        f.__name__, type(self).__name__))
-            else:
-               raise ValueError("the 'func' parameter ({}) for var of type {} is not callable".format(f, type(self).__name__))
+                    self.onChange[agent]=[f]
+        self._notifiers+=((mask, f),)
+        if self._dispatch is None:
+            self._dispatch={agent: (f,) if mask & bit else () for agent, bit in self.app.agentbits.items()}
         else:
-            for v in agents:
-                self.addNotify(func, v)
+            self._dispatch={agent: funcs+(f,) if mask & self.app.agentbits[agent] else funcs for agent, funcs in self._dispatch.items()}
 
     def removeNotify(self, func, agents):
-        if agents=='*':
-            self.removeNotify(func, self.app.agents)
-            return
-        if isinstance(agents, str):
-            if not agents in self.app.agents:
-                raise ValueError('the agent {} requested in removeNotify for var of type {} is not known to this tree -{}'.format(
-                    agents, type(self).__name__, self.app.agents))
-            if isinstance(func,str):
-                try:
-                    f=getattr(self.app, func)
-                except AttributeError:
-                    raise ValueError('the function {} requested in removeNotify for var of type {} is not a member of the app {}'.format(
-                    func, type(self).__name__, type(self.app).__name__))
-            else:
-                f=func
-            flist=self.onChange[agents]
-            find=flist.index(f)
-            flist.pop(find)
+        mask=self.agentmask(agents, 'removeNotify')
+        if isinstance(func,str):
+            try:
+                f=getattr(self.app, func)
+            except AttributeError:
+                raise ValueError('the function {} requested in removeNotify for var of type {} is not a member of the app {}'.format(
+                func, type(self).__name__, type(self.app).__name__))
         else:
-            for a in agents:
-                self.removeNotify(func,a)
+            f=func
+        notifiers=list(self._notifiers)
+        try:
+            for agent, bit in self.app.agentbits.items():
+                if mask & bit:
+                    flist=self.onChange[agent]
+                    find=flist.index(f)
+                    flist.pop(find)
+                    for ix, (emask, ef) in enumerate(notifiers):
+                        if emask & bit and ef==f:
+                            notifiers[ix]=(emask & ~bit, ef)
+                            break
+        finally:    # keep the notifiers matching onChange even if f was not found for one of the agents
+            self._setdispatch(tuple(entry for entry in notifiers if entry[0]))
+
+    def _setdispatch(self, notifiers):
+        """
+        sets the notifiers and prepares the dict used by notify, so it can go straight to the functions for an agent
+        """
+        self._notifiers=notifiers
+        if notifiers:
+            self._dispatch={agent: tuple(f for mask, f in notifiers if mask & bit) for agent, bit in self.app.agentbits.items()}
+        else:
+            self._dispatch=None
+
+    def agentmask(self, agents, opname='agentmask'):
+        """
+        returns the bit mask for the given agents (as used in the app's agentbits).
+        
+        agents  : can be a single agent, a list of agents or '*' for all agents
+
+        raises ValueError if any agent is not known to this tree
+        """
+        agentbits=self.app.agentbits
+        if isinstance(agents,str):
+            if agents=='*':
+                return (1 << len(agentbits))-1
+            if not agents in agentbits:
+                raise ValueError('the agent {} requested in {} for var of type {} is not known to this tree -{}'.format(
+                    agents, opname, type(self).__name__, self.app.agents))
+            return agentbits[agents]
+        mask=0
+        for agent in agents:
+            mask |= self.agentmask(agent, opname)
+        return mask
 
     def setupLogMsg(self):
         """
         log message generated when var created 
         """
         if self.loglvl <= logging.INFO:
-            self.log(logging.INFO, 'setup var {}, with value {}'.format(self.name, self.getValue()))
+            self.log(logging.INFO, 'setup var %s, with value %s', self.name, self.getValue())
 
     def __repr__(self):
         return "{}(value={}, loglvl={})".format(self.__class__.__name__, self.getValue(), self.loglvl)
@@ -272,7 +362,7 @@ class baseVar(ptree.treeob):
             return self.formatString.format(value=self.getValue(),var=self)
         except:
             emsg='FAIL in field {} of type {} using format string >{}< with  value={}'.format(self.getHierName(), type(self).__name__, self.formatString, self.getValue())
-            if self.loglvl <= loglvlvs.FATAL:
+            if self.loglvl <= logging.FATAL:
                 self.log(logging.FATAL, emsg)
             else:
                 print(emsg)
@@ -298,24 +388,25 @@ class baseVar(ptree.treeob):
         raises ValueError if the value is not valid
         raises RuntimeError if the agent is not in the known list of agents
         """
-        if agent in self.app.agents:
+        if agent in self.app.agentbits:
             oldValue=self.getValue()
             newValue=self.validValue(value, agent) # validates the value (raising ValueError if nasty) and returns a correct value
             if newValue==self._lvvalue:
                 if self.loglvl <= logging.DEBUG:
-                    self.log(10, 'var {} agent {} with value {} is unchanged as {}'.format(self.name, agent, value, oldValue))
+                    self.log(logging.DEBUG, 'var %s agent %s with value %s is unchanged as %s', self.name, agent, value, oldValue)
                 return False
             self._lvvalue=newValue
             if self.loglvl <= logging.DEBUG:
-                self.log(10, 'var {} agent {} with value {} updated from {} to {}'.format(self.name, agent, value, oldValue, newValue))
+                self.log(logging.DEBUG, 'var %s agent %s with value %s updated from %s to %s', self.name, agent, value, oldValue, newValue)
             self.notify(agent=agent, oldValue=oldValue, newValue=newValue)
             return True
         else:
             raise RuntimeError('agent {} not known in setting var {}'.format(agent, self.name))
 
     def notify(self, agent, oldValue, newValue):
-        if agent in self.onChange:
-            for f in self.onChange[agent]:
+        dispatch=self._dispatch
+        if dispatch:
+            for f in dispatch[agent]:
                 f(oldValue=oldValue, newValue=newValue, agent=agent, var=self)
 
     def validValue(self, value, agent):
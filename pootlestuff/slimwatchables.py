@@ -0,0 +1,114 @@
+"""
+This module provides compact versions of the watchable classes in watchables, for apps that create very large numbers
+of watchables (e.g. a watchable per channel for arrays of sensors).
+
+The classes have the same api and behaviour as the watchables classes (most of the methods are the same functions), but:
+    instances use __slots__ so there is no per instance __dict__
+    instances don't have their own lock, a lock is picked from a shared set of locks using the instance's id
+    the settings for the value (min, max, clamp etc.) are held in a shared immutable config object, so all the
+        instances with the same settings share one config object
+
+They can be used anywhere the watchables classes are used, for example in the wabledefs of a watchablegroup.
+"""
+import threading, sys, functools
+from collections import namedtuple
+from pootlestuff.watchables import watchable, floatWatch, intWatch, enumWatch, wflags, loglvls
+
+_locks=tuple(threading.Lock() for i in range(64))
+
+floatconfig=namedtuple('floatconfig', ('maxv', 'minv', 'clamp', 'allowNaN'))
+intconfig=namedtuple('intconfig', ('maxv', 'minv', 'clamp'))
+enumconfig=namedtuple('enumconfig', ('vlist', 'wrap', 'clamp'))
+
+@functools.lru_cache(maxsize=None)
+def sharedconfig(cfgclass, *args):
+    """
+    returns a config object for the given settings, instances with the same settings share the same config object
+    """
+    return cfgclass(*args)
+
+class slimwatchable():
+    """
+    the compact equivalent of watchables.watchable
+    """
+    __slots__=('_val', 'app', 'observers', '_json', 'flags', '_loglevel', '_debug')
+
+    def __init__(self, value, app, flags=wflags.NONE, loglevel=loglvls.INFO):
+        self._val=value
+        self.app=app
+        self.observers=None
+        self._json=None
+        self.flags=flags
+        self.loglevel=loglevel
+        if self._debug:
+            self.log(loglvls.DEBUG, 'watchable type %s setup with value %s', type(self).__name__, self._val)
+
+    @property
+    def oblock(self):
+        return _locks[(id(self) >> 4) & 63]
+
+    loglevel=watchable.loglevel
+    setValue=watchable.setValue
+    getValue=watchable.getValue
+    jsonbytes=watchable.jsonbytes
+    validValue=watchable.validValue
+    compareAndSet=watchable.compareAndSet
+    _changes=watchable._changes
+    notify=watchable.notify
+    _fire=watchable._fire
+    addNotify=watchable.addNotify
+    dropNotify=watchable.dropNotify
+    log=watchable.log
+
+class slimfloatWatch(slimwatchable):
+    """
+    the compact equivalent of watchables.floatWatch
+    """
+    __slots__=('cfg',)
+
+    def __init__(self, *, maxv=sys.float_info.max, minv=-sys.float_info.max, clamp=False, allowNaN=True, **kwargs):
+        self.cfg=sharedconfig(floatconfig, float(maxv), float(minv), clamp==True, allowNaN)
+        super().__init__(**kwargs)
+
+    maxv=property(lambda self: self.cfg.maxv)
+    minv=property(lambda self: self.cfg.minv)
+    clamp=property(lambda self: self.cfg.clamp)
+    allowNaN=property(lambda self: self.cfg.allowNaN)
+
+    validValue=floatWatch.validValue
+
+class slimintWatch(slimwatchable):
+    """
+    the compact equivalent of watchables.intWatch
+    """
+    __slots__=('cfg',)
+
+    def __init__(self, maxv=None, minv=None, clamp=False, **kwargs):
+        self.cfg=sharedconfig(intconfig, maxv if maxv is None else int(maxv), minv if minv is None else int(minv), clamp==True)
+        super().__init__(**kwargs)
+
+    maxv=property(lambda self: self.cfg.maxv)
+    minv=property(lambda self: self.cfg.minv)
+    clamp=property(lambda self: self.cfg.clamp)
+
+    validValue=intWatch.validValue
+    increment=intWatch.increment
+
+class slimenumWatch(slimwatchable):
+    """
+    the compact equivalent of watchables.enumWatch, vlist is held as a tuple
+    """
+    __slots__=('cfg',)
+
+    def __init__(self, vlist, wrap=True, clamp=False, **kwargs):
+        self.cfg=sharedconfig(enumconfig, tuple(vlist), wrap==True, clamp==True)
+        super().__init__(**kwargs)
+
+    vlist=property(lambda self: self.cfg.vlist)
+    wrap=property(lambda self: self.cfg.wrap)
+    clamp=property(lambda self: self.cfg.clamp)
+
+    validValue=enumWatch.validValue
+    getIndex=enumWatch.getIndex
+    increment=enumWatch.increment
+    setIndex=enumWatch.setIndex
@@ -6,8 +6,11 @@ are interested in.
 
 It supercedes the pvars module
 """
-import logging, sys, threading, pathlib, math, json
+import logging, sys, threading, pathlib, math, io, os, time, asyncio, array, atexit, weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, auto as enumauto, Flag
+from pootlestuff import jsonser
 
 class loglvls(Enum):
     """
@@ -30,6 +33,102 @@ class wflags(Flag):
     NONE        = 0
     DISABLED    = enumauto()
 
+_observerpool=None
+_poollock=threading.Lock()
+
+def observerpool():
+    """
+    returns the thread pool shared by observers added with mode 'pool', which is created when first needed
+    """
+    global _observerpool
+    with _poollock:
+        if _observerpool is None:
+            _observerpool=ThreadPoolExecutor(max_workers=4, thread_name_prefix='observer')
+        return _observerpool
+
+class queuedobserver():
+    """
+    wraps an observer so it is called in another thread (or an asyncio event loop) rather than in the thread that
+    changed the value.
+    
+    Notifications are queued and the observer is called with them one at a time in the order they were made, so the
+    observer sees changes in the same order as a synchronous observer would.
+    """
+    def __init__(self, callback, mode, maxqueue, policy, loop, executor):
+        """
+        see watchable.addNotify
+        """
+        self.callback=callback
+        self.mode=mode
+        self.maxqueue=maxqueue
+        self.policy=policy
+        self.loop=loop
+        self.executor=observerpool() if executor is None and mode=='pool' else executor
+        self.queue=deque()
+        self.qlock=threading.Condition()
+        self.running=False  # True while a drain of the queue is scheduled or running
+        self.dropped=0
+        self.maxdepth=0
+
+    def __call__(self, **kwargs):
+        with self.qlock:
+            if len(self.queue) >= self.maxqueue:
+                if self.policy=='dropoldest':
+                    self.queue.popleft()
+                    self.dropped+=1
+                else:
+                    self.qlock.wait_for(lambda: len(self.queue) < self.maxqueue)
+            self.queue.append(kwargs)
+            if len(self.queue) > self.maxdepth:
+                self.maxdepth=len(self.queue)
+            if self.running:
+                return
+            self.running=True
+        if self.mode=='loop':
+            asyncio.run_coroutine_threadsafe(self._adrain(), self.loop)
+        else:
+            self.executor.submit(self._drain)
+
+    def _next(self):
+        with self.qlock:
+            if self.queue:
+                kwargs=self.queue.popleft()
+                self.qlock.notify()
+                return kwargs
+            self.running=False
+            return None
+
+    def _failed(self, kwargs):
+        kwargs['watched'].log(loglvls.ERROR, 'observer %s failed', getattr(self.callback, '__name__', self.callback), exc_info=True)
+
+    def _drain(self):
+        kwargs=self._next()
+        while not kwargs is None:
+            try:
+                self.callback(**kwargs)
+            except:
+                self._failed(kwargs)
+            kwargs=self._next()
+
+    async def _adrain(self):
+        kwargs=self._next()
+        while not kwargs is None:
+            try:
+                res=self.callback(**kwargs)
+                if asyncio.iscoroutine(res):
+                    await res
+            except:
+                self._failed(kwargs)
+            kwargs=self._next()
+
+    def stats(self):
+        """
+        returns a dict with the current queue length, the longest the queue has been and the number of notifications
+        dropped
+        """
+        with self.qlock:
+            return {'queued': len(self.queue), 'maxdepth': self.maxdepth, 'dropped': self.dropped}
+
 class watchable():
     """
     provides a 'smart' object that provides basic observer functionality around an object.
@@ -48,11 +147,23 @@ class watchable():
         """
         self._val=value
         self.app=app
-        self.observers=None
+        self.observers=None     # dict of agent -> tuple of observers, replaced (never changed) when observers are added or dropped
         self.oblock=threading.Lock()
+        self._json=None     # (value, json encoded value) - set by jsonbytes
         self.flags=flags
         self.loglevel=loglevel
-        self.log(loglvls.DEBUG, 'watchable type %s setup with value %s' % (type(self).__name__, self._val))
+        if self._debug:
+            self.log(loglvls.DEBUG, 'watchable type %s setup with value %s', type(self).__name__, self._val)
+
+    @property
+    def loglevel(self):
+        return self._loglevel
+
+    @loglevel.setter
+    def loglevel(self, value):
+        # _debug is kept up to date so debug messages are only built (and log called) when they will be used
+        self._loglevel=value
+        self._debug=value.value <= loglvls.DEBUG.value
 
     def setValue(self, value, agent):
         """
@@ -75,12 +186,24 @@ class watchable():
             self.notify(newvalue, agent)
             return True
         else:
-            self.log(loglvls.DEBUG,'value unchanged (%s)' % self._val)
+            if self._debug:
+                self.log(loglvls.DEBUG, 'value unchanged (%s)', self._val)
             return False
 
     def getValue(self):
         return self._val
 
+    def jsonbytes(self):
+        """
+        returns the value (as returned by getValue) encoded as json (bytes). The encoding is kept until the value
+        changes, so values that are sent often (e.g. on web pages) are only encoded once.
+        """
+        jc=self._json
+        if jc is None or not jc[0] is self._val:
+            jc=(self._val, jsonser.dumpb(self.getValue()))
+            self._json=jc
+        return jc[1]
+
     def validValue(self, value, agent=None):
         """
         validates the given value and returns the canonical value which will be stored.
@@ -91,39 +214,109 @@ class watchable():
         """
         raise NotImplementedError()
 
-    def notify(self, newvalue, agent):
-        if self.observers:
-            clist=None
-            with self.oblock:
-                if agent in self.observers:
-                    clist=self.observers[agent].copy()
+    def compareAndSet(self, expected, value, agent):
+        """
+        sets the value only if the current value is equal to expected, so read-modify-write updates (like
+        intWatch.increment) can't lose changes made by other threads.
+        
+        The value is validated as for setValue. The check and change are done together holding the watchable's lock
+        (which is not held while the observers are called).
+        
+        returns True if the value was set (or was already the validated value), False if the current value is not expected
+        """
+        assert isinstance(agent, self.app.agentclass)
+        newvalue=self.validValue(value, agent)
+        with self.oblock:
             oldvalue=self._val
+            if oldvalue != expected:
+                return False
+            if newvalue == oldvalue:
+                return True
             self._val=newvalue
-            if clist:
-                for ob in clist:
-                    ob(oldValue=oldvalue, newValue=newvalue, agent=agent, watched=self)
-            self.log(loglvls.DEBUG,'value changed (%s)- observers called' % self._val)
-        else:
-            self._val=newvalue
-            self.log(loglvls.DEBUG,'value changed (%s)- no observers' % self._val)
+            self._json=None
+        self._fire(oldvalue, newvalue, agent)
+        return True
+
+    def notify(self, newvalue, agent):
+        oldvalue=self._val
+        self._val=newvalue
+        self._json=None
+        self._fire(oldvalue, newvalue, agent)
+
+    def _changes(self, oldvalue, newvalue):
+        """
+        returns the (oldValue, newValue) pair observers are called with for a change from oldvalue to newvalue, or None
+        if there is nothing to tell them. Used by _fire and watchbatch.apply.
+        """
+        return oldvalue, newvalue
+
+    def _fire(self, oldvalue, newvalue, agent):
+        obs=self.observers
+        clist=None if obs is None else obs.get(agent)
+        if clist:
+            for ob in clist:
+                ob(oldValue=oldvalue, newValue=newvalue, agent=agent, watched=self)
+            if self._debug:
+                self.log(loglvls.DEBUG, 'value changed (%s)- observers called', newvalue)
+        elif self._debug:
+            self.log(loglvls.DEBUG, 'value changed (%s)- no observers', newvalue)
 
-    def addNotify(self, callback, agent):
+    def addNotify(self, callback, agent, mode='sync', maxqueue=100, policy='block', loop=None, executor=None):
+        """
+        adds an observer that is called when the value is changed by the given agent.
+        
+        callback: called with keyword args oldValue, newValue, agent and watched
+        
+        agent   : the agent whose changes are of interest
+        
+        mode    : 'sync'  - callback is called in the thread that changes the value, before setValue returns
+                  'pool'  - callback is called in a thread from a pool (the shared observerpool() unless executor is given)
+                  'loop'  - callback is called in the asyncio event loop 'loop', if it returns a coroutine that is awaited
+                  For 'pool' and 'loop' the notifications are queued and the callback is called with them in order.
+        
+        maxqueue: for 'pool' and 'loop', the number of notifications that can be waiting
+        
+        policy  : what to do when maxqueue notifications are waiting:
+                  'block'       - the thread changing the value waits for space (don't use this if the value can be changed
+                                  in the event loop used by a 'loop' observer)
+                  'dropoldest'  - the oldest waiting notification is discarded
+        
+        returns the object added as the observer, for 'pool' and 'loop' this is a queuedobserver (which has a stats method)
+        """
         assert callable(callback)
         assert isinstance(agent, self.app.agentclass)
-        self.log(loglvls.DEBUG,'added watcher %s' % callback.__name__)
+        if mode=='sync':
+            pass
+        elif mode in ('pool', 'loop'):
+            if not policy in ('block', 'dropoldest'):
+                raise ValueError('unknown observer policy %s' % policy)
+            if mode=='loop' and loop is None:
+                raise ValueError("an event loop is needed for mode 'loop'")
+            callback=queuedobserver(callback, mode=mode, maxqueue=maxqueue, policy=policy, loop=loop, executor=executor)
+        else:
+            raise ValueError('unknown observer mode %s' % mode)
+        if self._debug:
+            self.log(loglvls.DEBUG, 'added watcher %s', getattr(callback, '__name__', callback))
         with self.oblock:
-            if self.observers is None:
-                self.observers={agent:[callback]}
-            elif agent in self.observers:
-                self.observers[agent].append(callback)
-            else:
-                self.observers[agent]=[callback]
+            newobs={} if self.observers is None else self.observers.copy()
+            newobs[agent]=newobs.get(agent, ())+(callback,)
+            self.observers=newobs
+        return callback
         
     def dropNotify(self, callback, agent):
+        """
+        removes an observer, callback can be the function passed to addNotify or the object returned by addNotify.
+        """
         with self.oblock:
             aglist=self.observers[agent]
-            ix = aglist.index(callback)
-            aglist.pop(ix)
+            for ix, ob in enumerate(aglist):
+                if ob==callback or (isinstance(ob, queuedobserver) and ob.callback==callback):
+                    break
+            else:
+                raise ValueError('%s is not an observer' % callback)
+            newobs=self.observers.copy()
+            newobs[agent]=aglist[:ix]+aglist[ix+1:]
+            self.observers=newobs
 
     def log(self, loglevel, *args, **kwargs):
         """
@@ -233,9 +426,11 @@ class intWatch(watchable):
 
     def increment(self, agent, count=1):
         incer=int(count)
-        newval=self.getValue()+incer
-        self.setValue(newval, agent)
-        return newval
+        while True:
+            current=self._val
+            newval=current+incer
+            if self.compareAndSet(current, newval, agent):
+                return newval
 
 class enumWatch(watchable):
     """
@@ -296,6 +491,136 @@ class btnWatch(watchable):
         self.notify(self._val, agent)
         return True
 
+class floatArrayWatch(watchable):
+    """
+    A watchable that holds a fixed length vector of floats (in an array.array) - for a bank of readings that are updated
+    together, rather than a floatWatch for each reading.
+    
+    The whole vector is validated and stored in one step, and observers are called once per change with oldValue and
+    newValue as dicts of index -> value holding just the entries that changed.
+    
+    setValue takes a sequence of values (the full vector), a single value (every entry is set to it) or a dict of
+    index -> value to change some of the entries.
+    
+    getValue returns the values as a list, getArray returns the array itself (which must not be modified) - for example
+    to use with numpy.frombuffer without copying.
+    """
+    typecode='d'
+    itemtype=float
+
+    def __init__(self, *, value, size=None, maxv=sys.float_info.max, minv=-sys.float_info.max, clamp=False, allowNaN=True, **kwargs):
+        """
+        value       : the initial values (as for setValue)
+        
+        size        : the number of values, if None the length of value is used
+        
+        maxv, minv, clamp and allowNaN are as for floatWatch and apply to each value
+        """
+        self.maxv=float(maxv)
+        self.minv=float(minv)
+        self.clamp=clamp==True
+        self.allowNaN=allowNaN
+        self.size=len(value) if size is None else size
+        super().__init__(value=self.validValue(value, None), **kwargs)
+
+    def _toarray(self, value):
+        if isinstance(value, dict):
+            arr=array.array(self.typecode, self._val)
+            for ix, v in value.items():
+                try:
+                    arr[int(ix)]=self.itemtype(v)
+                except IndexError:
+                    raise ValueError('index %s out of range for %s of %d values' % (ix, type(self).__name__, self.size)) from None
+            return arr
+        if isinstance(value, (str, int, float)):
+            return array.array(self.typecode, (self.itemtype(value),))*self.size
+        arr=array.array(self.typecode, map(self.itemtype, value))
+        if len(arr) != self.size:
+            raise ValueError('%d values given for %s of %d values' % (len(arr), type(self).__name__, self.size))
+        return arr
+
+    def validValue(self, value, agent):
+        """
+        value   : the requested new values - each is checked as floatWatch.validValue would
+        
+        returns : the valid new values (an array.array)
+        
+        raises  : ValueError if any value is invalid
+        """
+        arr=self._toarray(value)
+        nans=any(map(math.isnan, arr))
+        if nans and not self.allowNaN and not self.clamp:
+            raise ValueError('NaN is not allowed for this watchable')
+        vals=[v for v in arr if v==v] if nans else arr
+        if vals and (min(vals) < self.minv or max(vals) > self.maxv):
+            if not self.clamp:
+                raise ValueError('values outside range {} to {}'.format(self.minv, self.maxv))
+            minv, maxv = self.minv, self.maxv
+            arr=array.array(self.typecode, (minv if v < minv else maxv if v > maxv else v for v in arr))
+        return arr
+
+    def getValue(self):
+        return self._val.tolist()
+
+    def getArray(self):
+        return self._val
+
+    def getItem(self, index):
+        return self._val[index]
+
+    def _changes(self, oldarr, newarr):
+        """
+        returns dicts of index -> value (old and new) for just the entries that changed, or None if none changed
+        """
+        changed=[ix for ix, (ov, nv) in enumerate(zip(oldarr, newarr)) if ov != nv and (ov == ov or nv == nv)]
+        if not changed:
+            return None
+        return {ix: oldarr[ix] for ix in changed}, {ix: newarr[ix] for ix in changed}
+
+    def _fire(self, oldarr, newvalue, agent):
+        obs=self.observers
+        clist=None if obs is None else obs.get(agent)
+        changes=self._changes(oldarr, newvalue)
+        if clist and changes:
+            oldvals, newvals = changes
+            for ob in clist:
+                ob(oldValue=oldvals, newValue=newvals, agent=agent, watched=self)
+        if self._debug:
+            self.log(loglvls.DEBUG, '%d values changed', 0 if changes is None else len(changes[0]))
+
+class intArrayWatch(floatArrayWatch):
+    """
+    As floatArrayWatch, but for integers (in an array.array of 64 bit values). maxv, minv and clamp are as for intWatch.
+    """
+    typecode='q'
+    itemtype=int
+
+    def __init__(self, *, value, size=None, maxv=None, minv=None, clamp=False, **kwargs):
+        self.maxv=maxv if maxv is None else int(maxv)
+        self.minv=minv if minv is None else int(minv)
+        self.clamp=clamp==True
+        self.size=len(value) if size is None else size
+        watchable.__init__(self, value=self.validValue(value, None), **kwargs)
+
+    def validValue(self, value, agent):
+        """
+        value   : the requested new values - each is checked as intWatch.validValue would
+        
+        returns : the valid new values (an array.array)
+        
+        raises  : ValueError if any value is invalid
+        """
+        try:
+            arr=self._toarray(value)
+        except OverflowError as e:
+            raise ValueError(str(e)) from None
+        minv, maxv = self.minv, self.maxv
+        if arr and ((not minv is None and min(arr) < minv) or (not maxv is None and max(arr) > maxv)):
+            if not self.clamp:
+                raise ValueError('values outside range {} to {} for watchable'.format(minv, maxv))
+            arr=array.array(self.typecode, (minv if not minv is None and v < minv else maxv if not maxv is None and v > maxv else v for v in arr))
+        return arr
+
 class folderWatch(watchable):
     """
     Internally. the value is a pathlib path to a folder (subfolders are created automatically).
@@ -328,6 +653,87 @@ class folderWatch(watchable):
                     (True if includes is None else [1 for x in includes if pp.name.endswith(x)]) and 
                     (True if excludes is None else [1 for x in excludes if not pp.name.endswith(x)])]
 
+class watchbatch():
+    """
+    collects changes to the watchables in a watchablegroup so they can be applied together - see watchablegroup.batch
+    """
+    def __init__(self, group, agent):
+        self.group=group
+        self.agent=agent
+        self.changes={}     # name -> requested value
+
+    def set(self, name, value):
+        """
+        adds a change to the batch.
+        
+        name    : the name of one of the group's watchables (or the watchable itself)
+        
+        value   : the requested new value, which is validated when the batch is applied
+        """
+        if not isinstance(name, str):
+            name=self.group.wablename(name)
+        if not name in self.group.wablenames:
+            raise ValueError('%s is not a watchable in %s' % (name, type(self.group).__name__))
+        self.changes[name]=value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
+        return False
+
+    def apply(self):
+        """
+        validates every change, then (if all are valid) sets all the new values before calling any observers.
+        
+        Each observer is called once. An observer of just one of the changed watchables is called as usual. An observer
+        of more than one is called with oldValue and newValue as dicts of name -> value for the watchables it observes,
+        and with watched set to the group.
+        
+        raises ValueError (and changes nothing) if any value is invalid.
+        
+        returns the list of names of the watchables that changed
+        """
+        group, agent = self.group, self.agent
+        newvals=[]
+        failed=[]
+        for name, value in self.changes.items():
+            wable=getattr(group, name)
+            assert isinstance(agent, wable.app.agentclass)
+            if isinstance(wable, btnWatch):
+                newvals.append((name, wable, wable._val))   # buttons always notify, the value is not used
+                continue
+            try:
+                newvalue=wable.validValue(value, agent)
+            except Exception as e:
+                failed.append('%s (%s)' % (name, e))
+                continue
+            if newvalue != wable._val:
+                newvals.append((name, wable, newvalue))
+        if failed:
+            raise ValueError('batch not applied, invalid values for %s' % ', '.join(failed))
+        calls={}    # observer -> list of (name, watchable, old value, new value) - dicts keep the observers in order
+        with group.batchlock:
+            for name, wable, newvalue in newvals:
+                if wable.observers:
+                    changes=wable._changes(wable._val, newvalue)    # e.g. array watchables send just the changed entries
+                    if not changes is None:
+                        for ob in wable.observers.get(agent, ()):
+                            calls.setdefault(ob, []).append((name, wable)+changes)
+                wable._val=newvalue
+                wable._json=None
+        for ob, obchanges in calls.items():
+            if len(obchanges)==1:
+                name, wable, oldvalue, newvalue = obchanges[0]
+                ob(oldValue=oldvalue, newValue=newvalue, agent=agent, watched=wable)
+            else:
+                ob(oldValue={ch[0]: ch[2] for ch in obchanges}, newValue={ch[0]: ch[3] for ch in obchanges}, agent=agent, watched=group)
+        if group.loglevel.value <= loglvls.DEBUG.value:
+            group.log(loglvls.DEBUG, 'batch applied %d changes, %d observers called', len(newvals), len(calls))
+        return [nv[0] for nv in newvals]
+
 class watchablegroup(object):
     def __init__(self, value, wabledefs, loglevel=None):
         """
@@ -341,12 +747,15 @@ class watchablegroup(object):
             4:  kwargs to use when setting up the watchable
         """
         self.perslist=[]
+        self.wablenames=[]
+        self.batchlock=threading.Lock()
         self.loglevel=loglvls.INFO if loglevel is None else loglevel
         for awable in wabledefs:
             ch=self.makeChild(defn=awable, value=awable[2] if value is None else value.get(awable[0], awable[2]))
             if ch is None:
                 raise ValueError('child construction failed - see log')
             setattr(self, awable[0], ch)
+            self.wablenames.append(awable[0])
             if awable[3]:
                 self.perslist.append(awable[0])
 
@@ -384,9 +793,189 @@ class watchablegroup(object):
         return {kv: getattr(self,kv).getValue() for kv in self.perslist}
 
     def applysettings(self, settings, agent):
-        for k,v in settings:
-            if k in self.perslist:
-                getattr(self, k).setValue(v, agent)
+        """
+        applies a dict of settings (as returned by fetchsettings) as a single batch, entries that are not settings
+        are ignored.
+        """
+        with self.batch(agent) as b:
+            for k, v in settings.items():
+                if k in self.perslist:
+                    b.set(k, v)
+
+    def wablename(self, wable):
+        """
+        returns the name of one of this group's watchables
+        """
+        for name in self.wablenames:
+            if getattr(self, name) is wable:
+                return name
+        raise ValueError('watchable is not in %s' % type(self).__name__)
+
+    def batch(self, agent):
+        """
+        returns a watchbatch to make several changes together, use it as a context manager:
+        
+            with app.batch(myagents.user) as b:
+                b.set('width', 640)
+                b.set('height', 480)
+        
+        When the with block ends all the values are validated, then set, then the observers are called - each one just
+        once (see watchbatch.apply). If any value is invalid a ValueError is raised and no values are changed. If the
+        with block raises an exception the batch is abandoned.
+        """
+        return watchbatch(self, agent)
+
+_persisters=weakref.WeakSet()
+
+@atexit.register
+def _flushpersisters():
+    # saves waiting changes for apps whose close doesn't call watchablesmart.close
+    for persister in list(_persisters):
+        persister.flush()
+
+class settingspersister():
+    """
+    writes an app's settings file in a background thread.
+    
+    Requests to save are coalesced: the first request starts a delay, and a single write at the end of the delay saves
+    the settings as they are then, however many requests arrived meanwhile. The file is written to a temporary file in
+    the same folder which then replaces the settings file, so the settings file is always complete.
+    
+    Any save still waiting when the program exits is done then, even if close is not called.
+    """
+    def __init__(self, fetch, path, log, delay=2, fsync=False):
+        """
+        fetch   : function that returns the settings (a dict) to save
+        
+        path    : pathlib.Path of the settings file
+        
+        log     : the app's log function
+        
+        delay   : seconds to wait after a request before writing the file
+        
+        fsync   : if True the file (and folder) are synced to disk before the write is complete
+        """
+        self.fetch=fetch
+        self.path=path
+        self.log=log
+        self.delay=delay
+        self.fsync=fsync
+        self.lock=threading.Condition()
+        self.wlock=threading.Lock()     # held while writing, so a flush and a background write can't both write at once
+        self.pending=False
+        self.running=True
+        self.thread=None
+        self.requests=0
+        self.writes=0
+        self.failures=0
+        self.writetime=0        # total time spent writing (seconds)
+        self.maxwritetime=0     # longest write (seconds)
+        _persisters.add(self)
+
+    def request(self):
+        """
+        asks for the settings to be saved, returns at once
+        """
+        with self.lock:
+            self.requests+=1
+            if self.pending or not self.running:
+                return
+            self.pending=True
+            if self.thread is None:
+                self.thread=threading.Thread(name='settingssaver', target=self._run, daemon=True)
+                self.thread.start()
+            else:
+                self.lock.notify()
+
+    def _run(self):
+        with self.lock:
+            while self.running:
+                if self.pending:
+                    self.lock.wait(self.delay)
+                    if self.pending:
+                        self.pending=False
+                        self.lock.release()
+                        try:
+                            self.write()
+                        finally:
+                            self.lock.acquire()
+                else:
+                    self.lock.wait()
+
+    def write(self):
+        """
+        saves the settings now (in the caller's thread), returns True if the settings were saved
+        """
+        with self.wlock:
+            return self._write()
+
+    def _write(self):
+        started=time.perf_counter()
+        try:
+            setts=self.fetch()
+        except:
+            self.log(loglvls.WARN,'fetchsettings failed', exc_info=True, stack_info=True)
+            return False
+        settstr=io.StringIO()
+        try:
+            jsonser.dumpfile(setts, settstr)
+        except:
+            self.log(loglvls.WARN,'json conversion of these settings failed', exc_info=True, stack_info=True)
+            self.log(loglvls.WARN,str(setts))
+            return False
+        tpath=self.path.with_name('.%s.tmp' % self.path.name)
+        try:
+            with tpath.open('w') as sfo:
+                sfo.write(settstr.getvalue())
+                if self.fsync:
+                    sfo.flush()
+                    os.fsync(sfo.fileno())
+            os.replace(tpath, self.path)
+            if self.fsync:
+                dfd=os.open(self.path.parent, os.O_RDONLY)
+                try:
+                    os.fsync(dfd)
+                finally:
+                    os.close(dfd)
+        except:
+            self.failures+=1
+            self.log(loglvls.WARN,'save settings failed to write file', exc_info=True, stack_info=True)
+            return False
+        elapsed=time.perf_counter()-started
+        self.writes+=1
+        self.writetime+=elapsed
+        self.maxwritetime=max(self.maxwritetime, elapsed)
+        self.log(loglvls.INFO,'settings saved to file %s' % str(self.path))
+        return True
+
+    def flush(self):
+        """
+        if a save is waiting, does it now (in the caller's thread)
+        """
+        with self.lock:
+            dowrite=self.pending
+            self.pending=False
+        if dowrite:
+            self.write()
+
+    def close(self):
+        """
+        saves any waiting changes and stops the background thread
+        """
+        with self.lock:
+            self.running=False
+            self.lock.notify()
+        if not self.thread is None:
+            self.thread.join()
+        self.flush()
+
+    def stats(self):
+        """
+        returns a dict with the counts of save requests, writes and failed writes, and the average and longest
+        write times (seconds)
+        """
+        return {'requests': self.requests, 'writes': self.writes, 'failures': self.failures,
+                'avgwritetime': self.writetime/self.writes if self.writes else 0, 'maxwritetime': self.maxwritetime}
 
 class watchablesmart(watchablegroup):
     """
@@ -404,8 +993,15 @@ class watchablesmart(watchablegroup):
             lower levels always expect a dict
     
     app:    If app is None, this node is the app, otherwise it should be the app object (which provides logging and save /  restore settings
+    
+    savedelay: for the top level, changes to settings are saved to the settings file this many seconds after the first
+            change (see settingspersister)
+    
+    savefsync: for the top level, if True the settings file is synced to disk when it is saved
+    
+    Apps that override close should call this class's close so waiting changes to settings are saved.
     """
-    def __init__(self, value, app=None, loglevel=loglvls.INFO, **kwargs):
+    def __init__(self, value, app=None, loglevel=loglvls.INFO, savedelay=2, savefsync=False, **kwargs):
         if app==None: # this is the real (top level) app
             if loglevel is None or loglevel is loglvls.NONE:
                 self.logger=None
@@ -420,6 +1016,8 @@ class watchablesmart(watchablegroup):
                 self.log(loglvls.INFO,'logging level is %s' % loglevel)
             self.startsettings, lmsg, self.settingsfrom = loadsettings(value)
             self.log(loglvls.INFO, lmsg)
+            self.persister=None if self.settingsfrom is None else settingspersister(fetch=self.fetchsettings,
+                        path=self.settingsfrom, log=self.log, delay=savedelay, fsync=savefsync)
         else:
             self.app=app
             self.agentclass=app.agentclass
@@ -433,32 +1031,27 @@ class watchablesmart(watchablegroup):
         else:
             if self.logger:
                 self.logger.log(level.value, msg, *args, **kwargs)
-            elif level.value >= loglvls.WARN:
-                print(msg) 
+            elif level.value >= loglvls.WARN.value:
+                print(msg % args if args else msg)
 
     def savesettings(self, oldValue, newValue, agent, watched):
+        """
+        requests the settings are saved to the settings file. This is usually called as a watchable's observer,
+        the save is done shortly afterwards in a background thread.
+        """
         if hasattr(self, 'app'):
             raise ValueError('only the app level can save settings')
-        try:
-            setts = self.fetchsettings()
-        except:
-            self.log(loglvls.WARN,'fetchsettings failed', exc_info=True, stack_info=True)
-            setts = None
-        if not setts is None:
-            try:
-                settstr=json.dumps(setts, indent=4)
-            except:
-                self.log(loglvls.WARN,'json conversion of these settings failed', exc_info=True, stack_info=True)
-                self.log(loglvls.WARN,str(setts))
-                settstr=None
-        if not settstr is None:
-            try:
-                with self.settingsfrom.open('w') as sfo:
-                    sfo.write(settstr)
-            except:
-                self.log(loglvls.WARN,'save settings failed to write file', exc_info=True, stack_info=True)
-                return
-            self.log(loglvls.INFO,'settings saved to file %s' % str(self.settingsfrom))
+        if self.persister is None:
+            self.log(loglvls.WARN,'no settings file to save to')
+        else:
+            self.persister.request()
+
+    def close(self):
+        """
+        saves any waiting changes to settings
+        """
+        if not hasattr(self, 'app') and not self.persister is None:
+            self.persister.close()
 
 class watchablepigpio(watchablesmart):
     """
@@ -490,6 +1083,7 @@ class watchablepigpio(watchablesmart):
             self.pio.stop()
             self.mypio=False
         self.pio=None
+        super().close()
 
 class watchableAct(watchablegroup):
     """
@@ -540,7 +1134,7 @@ def loadsettings(value):
         if spath.is_file():
             try:
                 with spath.open('r') as spo:
-                    startsettings=json.load(spo)
+                    startsettings=jsonser.load(spo)
                 return startsettings, 'app settings loaded from file %s' % spath, spath
             except:
                 return {}, 'failed to load settings from %s - default values used' % spath, spath
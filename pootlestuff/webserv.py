@@ -13,7 +13,7 @@ A KeyboardInterrupt should stop the entire service running and exit.
 The configuration file (a python module) controls the initial setup of the web server and provides a setup function which starts
 the app(s) and returns the web server's config (a dict)
  """
-import sys, argparse, pathlib, importlib, logging, http.server, threading
+import sys, argparse, pathlib, importlib, logging, threading
 
 from pootlestuff import netinf
 
@@ -89,7 +89,7 @@ def runmain():
     toplog.info(smsg)
 
     server = configmodule.httpserverclass(('',configmodule.webport),configmodule.httprequestclass, config=config)
-    assert isinstance(server, http.server.HTTPServer)
+    assert hasattr(server, 'serve_forever') and hasattr(server, 'close')
     if args.interactive:
         toplog.info('interactive mode - start at server.mypyobjects')
         sthread=threading.Thread(target=server.serve_forever)